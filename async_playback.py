@@ -0,0 +1,197 @@
+import asyncio
+import threading
+import playback as pb
+# pygame is imported by init(), so that backends without audio never load it
+pygame = None
+
+## Non-blocking playback
+# Coroutine versions of the playback functions, so that playback, animation and user input can share one event loop.
+# Timelines are played by the audio backend in use (see pb.get_backend), like the blocking playback functions.
+# Sounds complete after their known length, MIDI files complete on the mixer end-of-music event.
+# Cancelling a playback task stops its sound.
+# SDL only pumps the event queue on the thread that initialized the display, so one dedicated thread does both,
+# whichever thread or event loop the playback coroutines run on. It sleeps until a future waits for an event.
+# This thread is not the main thread, which macOS requires for the display: there, MIDI playback can't
+# complete on end-of-music events.
+
+music_end_event_count = 16 # End-of-music event types cycled through, one per MIDI playback
+event_wait_timeout = 1000 # ms. Longest wait of the event thread for an event before it checks its waiters again
+
+# Futures waiting for an event, by event type. Shared with the event thread, which is notified when it changes
+_waiters = {}
+_waiters_changed = threading.Condition()
+# Thread owning the pygame display and event queue
+_event_thread = None
+_event_thread_lock = threading.Lock()
+_event_thread_ready = threading.Event()
+_event_thread_error = None
+# Event type posted to wake up the event thread when a future starts waiting
+_wake_event = None
+# End-of-music event types, allocated on first use, and the index of the last one used
+_music_end_events = []
+_music_end_index = 0
+# Background event loop used by start()
+_background_loop = None
+_background_lock = threading.Lock()
+
+def init():
+    """Initializes the mixer and starts the event thread, which initializes the pygame display.
+       Only needed to wait for events: sounds play with the mixer alone
+    """
+    global _event_thread, _wake_event, pygame
+    pb.init()
+    pygame = pb.pygame
+    with _event_thread_lock:
+        if _event_thread is None:
+            _wake_event = pygame.event.custom_type()
+            _music_end_events.extend(pygame.event.custom_type() for _ in range(music_end_event_count))
+            _event_thread = threading.Thread(target=_run_event_thread, name='pygame-events', daemon=True)
+            _event_thread.start()
+    _event_thread_ready.wait()
+    if _event_thread_error is not None:
+        raise _event_thread_error
+
+def _run_event_thread():
+    """Initializes the pygame display, then waits for events and wakes up the futures waiting for them.
+       Sleeps on _waiters_changed while no future waits. Events nobody waits for are held,
+       and posted back to the queue for their consumers when the thread goes back to sleep.
+    """
+    global _event_thread_error
+    try:
+        if not pygame.display.get_init():
+            pygame.display.init()
+    except pygame.error as e:
+        _event_thread_error = e
+        return
+    finally:
+        _event_thread_ready.set()
+    held = []
+    while True:
+        with _waiters_changed:
+            if not any(_waiters.values()):
+                for event in held:
+                    pygame.event.post(event)
+                held.clear()
+                _waiters_changed.wait_for(lambda: any(_waiters.values()))
+        event = pygame.event.wait(event_wait_timeout)
+        if event.type in (pygame.NOEVENT, _wake_event):
+            # Timeout or new waiter: check the held events again
+            events, held = held, []
+        else:
+            events = [event]
+        for event in events:
+            with _waiters_changed:
+                futures = list(_waiters.get(event.type, []))
+            for future in futures:
+                future.get_loop().call_soon_threadsafe(_resolve, future, event)
+            if not futures:
+                held.append(event)
+
+def _resolve(future, event):
+    if not future.done():
+        future.set_result(event)
+
+async def wait_for_event(event_type):
+    """Returns the next pygame event of event_type, without blocking the event loop.
+       Events posted before the call are returned too, if still in the queue.
+
+    Arguments:
+    event_type -- pygame event type
+    """
+    init()
+    future = asyncio.get_running_loop().create_future()
+    with _waiters_changed:
+        _waiters.setdefault(event_type, []).append(future)
+        _waiters_changed.notify()
+    # Wake the event thread if it is already waiting, in case it holds the event
+    pygame.event.post(pygame.event.Event(_wake_event))
+    try:
+        return await future
+    finally:
+        with _waiters_changed:
+            _waiters[event_type].remove(future)
+
+def _next_music_end_event():
+    """Returns the end-of-music event type of a new MIDI playback, cleared of events left by earlier playbacks"""
+    global _music_end_index
+    init()
+    _music_end_index = (_music_end_index + 1) % len(_music_end_events)
+    event_type = _music_end_events[_music_end_index]
+    # No pump: only the event thread may pump the queue
+    pygame.event.clear(event_type, pump=False)
+    return event_type
+
+async def play_sound(sound, ms=None):
+    """Plays a pygame Sound and returns when it ends
+
+    Arguments:
+    sound -- pygame Sound object
+    ms -- length in milliseconds to play. Defaults to the length of the sound
+    """
+    pb.init()
+    sound.play()
+    try:
+        await asyncio.sleep(ms / 1000 if ms is not None else sound.get_length())
+    finally:
+        sound.stop()
+
+async def play(segments, name=None):
+    """Plays a timeline of (notes, ms) segments with the audio backend in use and returns when it ends
+
+    Arguments:
+    segments -- iterable of (notes, ms) pairs. See pb.scale_segments, pb.chord_segments..etc
+    name -- name of the timeline, used by backends that save what they play
+    """
+    await pb.get_backend().play_async(segments, name)
+
+async def play_synth(segments):
+    """Synthesizes a timeline and plays it through the pygame mixer. Used by pb.PygameBackend
+
+    Arguments:
+    segments -- iterable of (notes, ms) pairs
+    """
+    for notes, ms in segments:
+        if notes:
+            await play_sound(pb.notes_sound(notes, n_samples=pb.ms_to_samples(ms)), ms)
+        else:
+            await asyncio.sleep(ms / 1000)
+
+async def play_midi(midi_file):
+    """Plays a MIDI file and returns when the mixer reports the end of the music
+
+    Arguments:
+    midi_file -- path or file object (ex.: from pb.create_segments_midi) of a MIDI file
+    """
+    # Each playback gets its own end event type, so that the end event of a stopped track
+    # can't complete a later playback
+    end_event = _next_music_end_event()
+    pygame.mixer.music.set_endevent(end_event)
+    if isinstance(midi_file, str):
+        pygame.mixer.music.load(midi_file)
+    else:
+        # File objects carry no extension, so tell the mixer the format
+        pygame.mixer.music.load(midi_file, 'mid')
+    pygame.mixer.music.play()
+    try:
+        await wait_for_event(end_event)
+    except asyncio.CancelledError:
+        pygame.mixer.music.stop()
+        raise
+
+def run(coroutine):
+    """Sync wrapper: runs a playback coroutine to completion and returns its result"""
+    return asyncio.run(coroutine)
+
+def start(coroutine):
+    """Starts a playback coroutine on a shared background event loop without waiting for it.
+       Returns a concurrent.futures.Future. Call its cancel() to stop the playback.
+    """
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _background_loop)
+
+if __name__ == '__main__':
+    print('module for non-blocking playback functions')
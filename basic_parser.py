@@ -1,11 +1,26 @@
 import argparse
 import mt_toolbox as mt
+import theory_packs
+
+def load_packs():
+    """Registers the scale and chord packs passed with --pack
+    Packs must be loaded before building the parser, since their scales and chords are valid choices
+    """
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument('--pack', action='append', default=[])
+    args, _ = pre_parser.parse_known_args()
+    for path in args.pack:
+        try:
+            theory_packs.register_pack(path)
+        except (ValueError, OSError) as e:
+            pre_parser.error(f"**{e}**")
 
 def basic_parser(script_description):
     """Parser for common arguments used in all scripts
     Arguments:
     script_description -- Description of the script to use in the help message
     """
+    load_packs()
     parser = argparse.ArgumentParser(description=script_description)
     root_choices = list(mt.basic_notes.keys())
     root_choices.extend(note_info['alt_name'] for note_info in mt.basic_notes.values() if note_info['alt_name'])
@@ -24,6 +39,7 @@ def basic_parser(script_description):
     group.add_argument('-l','--list', help='List available scales, chords and notes', action ='store_true')
 
     parser.add_argument('-r','--root', choices=root_choices ,help='Root note name', default = 'C', metavar = '')
+    parser.add_argument('--pack', action='append', help='JSON/TOML file of extra scales and chords to load. Can be repeated', metavar = '')
     parser.add_argument('-m','--mode', choices=mode_choices ,help='Mode to play scale in', default = 'Ionian', metavar = '')
 
     return parser, group
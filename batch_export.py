@@ -0,0 +1,153 @@
+import argparse
+import multiprocessing
+import os
+import mt_toolbox as mt
+import playback as pb
+import theory_packs
+
+## Batch export
+# Exports every (root, scale, mode) and (root, chord) combination to PNG images and/or WAV files.
+# Jobs are spread over a pool of processes. Each worker draws on its own headless (Agg) figure,
+# and results stream back as they finish, in any order.
+
+FORMATS = ['png', 'wav', 'gif', 'frames'] # 'frames': numbered PNG frames of the animation
+# Jobs handed to a worker at a time
+CHUNK_SIZE = 8
+
+def iter_jobs(roots=None, scales=None, modes=None, chords=None, octave=4):
+    """Generates the export jobs of the cartesian products root x scale x mode and root x chord.
+       Modes other than Ionian are only generated for heptatonic scales.
+
+    Arguments:
+    roots -- list of root note names. Defaults to all 12 notes
+    scales -- list of scale names. None for no scales
+    modes -- list of mode names. Defaults to Ionian only
+    chords -- list of chord names. None for no chords
+    octave -- octave of the root notes
+    """
+    roots = roots or list(mt.basic_notes)
+    modes = modes or ['Ionian']
+    for root_name in roots:
+        for scale_name in scales or []:
+            heptatonic = len(mt.scale_steps[scale_name]) == 7
+            for mode_name in modes:
+                if heptatonic or mode_name == 'Ionian':
+                    yield ('scale', root_name, scale_name, mode_name, octave)
+        for chord_name in chords or []:
+            yield ('chord', root_name, chord_name, None, octave)
+
+## Workers
+##########
+VIEW = None
+_output_dir = None
+_formats = None
+_tuning = None # Tuning system and A4 pitch of the parent. Set on the root of each job
+
+def _init_worker(output_dir, formats, tuning, a4, packs):
+    """Sets up a worker process: headless matplotlib backend, tuning and packs of the parent"""
+    global _output_dir, _formats, _tuning, VIEW
+    import matplotlib
+    matplotlib.use('Agg')
+    import chord_visualizer
+    VIEW = chord_visualizer
+    _output_dir = output_dir
+    _formats = formats
+    _tuning = (tuning, a4)
+    for path in packs:
+        theory_packs.register_pack(path)
+    # Same playback settings as music_theory_lab.py
+    pb.REVERSE_SCALE = True
+    pb.ARPEGGIATE = True
+
+def _export(job):
+    """Exports one job in a worker. Returns (job, list of written paths, error message or None)"""
+    object_type, root_name, name, mode_name, octave = job
+    try:
+        # Tuned on the root, as when playing it from music_theory_lab.py
+        mt.set_tuning(*_tuning, tonic=root_name)
+        if object_type == 'scale':
+            notes = mt.construct_scale_array(root_name, name, mode_name, octave)
+            file_name = f'{root_name}_{mode_name}_{name}_scale'
+            if mode_name != 'Ionian':
+                label = f'{root_name} {mode_name} of\n{name}\nscale'
+            else:
+                label = f'{root_name}\n{name}\nscale'
+            segments = pb.scale_segments(notes, ms=300)
+        else:
+            notes = mt.construct_chord_array(root_name, name, octave)
+            file_name = f'{root_name}_{name}_chord'
+            label = f'{root_name}\n{name}\nchord'
+            segments = pb.chord_segments(notes)
+    except ValueError as e:
+        return job, [], str(e)
+    paths = []
+    if 'png' in _formats:
+        path = os.path.join(_output_dir, file_name + '.png')
+        VIEW.setup_parameters(notes, root_name, label)
+        VIEW.save_plot_image(path)
+        paths.append(path)
+    if 'gif' in _formats:
+        path = os.path.join(_output_dir, file_name + '.gif')
+        VIEW.setup_parameters(notes, root_name, label)
+        VIEW.export_animation(path, 'gif')
+        paths.append(path)
+    if 'frames' in _formats:
+        path = os.path.join(_output_dir, file_name)
+        VIEW.setup_parameters(notes, root_name, label)
+        VIEW.export_animation(path, 'png')
+        paths.append(path + '_*.png')
+    if 'wav' in _formats:
+        path = os.path.join(_output_dir, file_name + '.wav')
+        pb.write_wav_stream(path, pb.stream_blocks(segments))
+        paths.append(path)
+    return job, paths, None
+
+def export_batch(output_dir, formats=('png', 'wav'), workers=None, tuning='12-TET', a4=mt.A4_FREQUENCY, packs=(), progress=None, **kwargs):
+    """Exports jobs over a process pool. Returns the (job, paths, error) results
+
+    Arguments:
+    output_dir -- directory to write the files to
+    formats -- list of output formats ('png', 'wav', 'gif', 'frames')
+    workers -- number of worker processes. Defaults to the CPU count
+    tuning -- tuning system name, as passed to mt.set_tuning
+    a4 -- reference pitch of A4 in Hz
+    packs -- paths of the scale and chord packs to load in the workers
+    progress -- function called with (done count, total count, result) as each job finishes
+    kwargs -- passed to iter_jobs (roots, scales, modes, chords, octave)
+    """
+    if not set(formats) <= set(FORMATS):
+        raise ValueError("Invalid export format")
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = list(iter_jobs(**kwargs))
+    results = []
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(output_dir, list(formats), tuning, a4, list(packs))) as pool:
+        for result in pool.imap_unordered(_export, jobs, chunksize=CHUNK_SIZE):
+            results.append(result)
+            if progress:
+                progress(len(results), len(jobs), result)
+    return results
+
+def print_progress(done, total, result):
+    """Default progress report: one line per finished job"""
+    job, paths, error = result
+    print(f'[{done}/{total}] ' + (', '.join(paths) if error is None else f'skipped {" ".join(p for p in job[1:4] if p)}: {error}'))
+
+def main():
+    parser = argparse.ArgumentParser(description='batch_export.py: Export scales and chords to PNG images and WAV files in parallel')
+    parser.add_argument('output_dir', help='Directory to write the files to')
+    parser.add_argument('-f','--formats', nargs='+', choices=FORMATS, help='Output formats', default = ['png', 'wav'], metavar = '')
+    parser.add_argument('-j','--workers', help='Number of worker processes. Defaults to the CPU count', type = int, metavar = '')
+    parser.add_argument('-r','--roots', nargs='+', choices=list(mt.basic_notes), help='Root notes to export. Defaults to all', metavar = '')
+    parser.add_argument('-o','--octave', choices=[i for i in range(0, 9)], help='Octave settings', default = 4, type = int, metavar = '')
+    parser.add_argument('--no-scales', help='Do not export scales', action ='store_true')
+    parser.add_argument('--no-chords', help='Do not export chords', action ='store_true')
+    parser.add_argument('--no-modes', help='Export scales in the Ionian mode only', action ='store_true')
+    args = parser.parse_args()
+    results = export_batch(args.output_dir, args.formats, args.workers, progress=print_progress, roots=args.roots, octave=args.octave,
+                           scales=None if args.no_scales else list(mt.all_scale_info),
+                           modes=None if args.no_modes else list(mt.mode_info),
+                           chords=None if args.no_chords else list(mt.all_chord_info))
+    print(f'Exported {sum(1 for r in results if r[2] is None)} of {len(results)} scales and chords to {args.output_dir}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import csv
+import io
+import json
+import mt_toolbox as mt
+
+# Record fields, in CSV column order. List fields are space separated in CSV output
+FIELDS = ['type', 'root', 'name', 'mode', 'octave', 'notes', 'midi_ids', 'intervals', 'frequencies']
+# Size of the file write buffer in bytes
+BUFFER_SIZE = 1 << 16
+
+def _record(object_type, root_name, name, mode_name, octave, notes, intervals):
+    """Returns an export record (dict) of a constructed scale or chord"""
+    notes = mt.as_note_array(notes)
+    return {
+        'type': object_type,
+        'root': root_name,
+        'name': name,
+        'mode': mode_name,
+        'octave': octave,
+        'notes': notes.names.tolist(),
+        'midi_ids': notes.midi_ids.tolist(),
+        'intervals': intervals,
+        'frequencies': [round(f, 4) for f in notes.frequencies.tolist()],
+    }
+
+def iter_catalog(roots=None, octaves=(4,), scales=True, chords=True):
+    """Generates an export record for every (root, scale, mode) and (root, chord) combination, one at a time.
+       Modes are only generated for heptatonic scales. Combinations exceeding the supported octave range are skipped.
+
+    Arguments:
+    roots -- list of root note names. Defaults to all 12 notes
+    octaves -- octaves at which to construct the scales and chords
+    scales -- whether to include scales
+    chords -- whether to include chords
+    """
+    roots = roots or list(mt.basic_notes)
+    for octave in octaves:
+        for root_name in roots:
+            if scales:
+                for scale_name, steps in mt.scale_steps.items():
+                    for mode_name in (mt.mode_info if len(steps) == 7 else ['Ionian']):
+                        try:
+                            notes = mt.construct_scale(root_name, scale_name, mode_name, octave)
+                        except ValueError:
+                            continue
+                        positions = [(n.midi_id - notes[0].midi_id) % 12 for n in notes]
+                        yield _record('scale', root_name, scale_name, mode_name, octave, notes, mt.positions_to_intervals(positions))
+            if chords:
+                for chord_name, chord_info in mt.all_chord_info.items():
+                    try:
+                        notes = mt.construct_chord(root_name, chord_name, octave)
+                    except ValueError:
+                        continue
+                    yield _record('chord', root_name, chord_name, None, octave, notes, [str(i) for i in chord_info['signature']])
+
+def iter_jsonl(records):
+    """Generates one JSON line per record"""
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+def iter_csv(records):
+    """Generates a CSV header line followed by one CSV line per record"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for record in records:
+        writer.writerow(' '.join(map(str, v)) if isinstance(v, list) else v for v in (record[f] for f in FIELDS))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # header of an empty export
+        yield buffer.getvalue()
+
+def export_catalog(path, fmt=None, **kwargs):
+    """Streams the catalog to a JSONL or CSV file through a buffered writer. Returns the number of records written.
+
+    Arguments:
+    path -- output file path
+    fmt -- 'jsonl' or 'csv'. Defaults to the file extension
+    kwargs -- passed to iter_catalog (roots, octaves, scales, chords)
+    """
+    fmt = fmt or path.rsplit('.', 1)[-1]
+    if fmt not in ('jsonl', 'csv'):
+        raise ValueError("Invalid export format")
+    count = 0
+    def counted(records):
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+    lines = (iter_jsonl if fmt == 'jsonl' else iter_csv)(counted(iter_catalog(**kwargs)))
+    with open(path, 'w', newline='', buffering=BUFFER_SIZE) as f:
+        f.writelines(lines)
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description='catalog_export.py: Export all scales and chords to a JSONL or CSV file')
+    parser.add_argument('path', help='Output file path (.jsonl or .csv)')
+    parser.add_argument('-f','--format', choices=['jsonl', 'csv'], help='Output format. Defaults to the file extension', metavar = '')
+    parser.add_argument('-o','--octaves', nargs='+', choices=[i for i in range(0, 9)], help='Octaves to export', default = [4], type = int, metavar = '')
+    parser.add_argument('-r','--roots', nargs='+', choices=list(mt.basic_notes), help='Root notes to export. Defaults to all', metavar = '')
+    args = parser.parse_args()
+    count = export_catalog(args.path, args.format, roots=args.roots, octaves=args.octaves)
+    print(f'Exported {count} scales and chords to {args.path}')
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,9 @@
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.animation import FuncAnimation
 from mt_toolbox import basic_notes, INTERVAL_LIST
+from note import as_note_array
 
-# Set up the figure and axis
-fig, ax = plt.subplots(figsize=(8, 8), facecolor='gray')
-fig.canvas.manager.set_window_title('Chord visualizer')
-# Remove axes
-ax.axis('off')
+# Figure and axis. Created by setup_figure on first use, since importing matplotlib is slow
+fig, ax = None, None
 # color of center circle and note lines
 structure_color = 'black'
 
@@ -39,101 +35,128 @@ tick_length = 0.05
 offset_from_circle_center = 0.3 # for interval labels
 circle_radius = 0.2 # note circles radius
 
+## Precomputed geometry
+# Unit circle coordinates of the 12 chromatic angles
+chromatic_x = np.cos(np.deg2rad(chromatic_angle_degrees[:-1]))
+chromatic_y = np.sin(np.deg2rad(chromatic_angle_degrees[:-1]))
+# Coordinates of chromatic position pos for a root at chromatic index r: [r, pos]. One row per rotation
+rotation_indexes = (np.arange(12).reshape(-1, 1) + np.arange(12)) % 12
+rotated_x = chromatic_x[rotation_indexes]
+rotated_y = chromatic_y[rotation_indexes]
+# Distance of the note name labels from the center, relative to the note circles
+label_distance = 1 + circle_radius + offset_from_circle_center
+# Chromatic index of the current root. Assigned by apply_rotations
+root_position = 0
+
+## Persistent artists
+# Artists of each drawn note (spoke line, note circle, note name label, interval label). Updated, never recreated
+note_artists = []
+# Text at the center of the wheel with the object name
+name_text = None
+
+def setup_figure():
+    """Creates the figure and axis and draws the static wheel, if not created yet"""
+    global fig, ax, name_text
+    if fig is not None:
+        return
+    import matplotlib.pyplot as plt
+    # Set up the figure and axis
+    fig, ax = plt.subplots(figsize=(8, 8), facecolor='gray')
+    fig.canvas.manager.set_window_title('Chord visualizer')
+    # Set the figure and axis size once, for all frames
+    ax.set_xlim(-1.5, 1.5)
+    ax.set_ylim(-1.5, 1.5)
+    # Set aspect ratio to equal
+    ax.set_aspect('equal')
+    # Remove axes
+    ax.axis('off')
+    plot_base_circles()
+    name_text = ax.text(0, 0, '', ha='center', va='center', color='white', fontsize=10, weight='bold')
+
 def plot_base_circles():
-    """Function to plot the center circle and the ticks (chromatic clock) circle
+    """Function to plot the center circle and the ticks (chromatic clock) circle. Drawn once per figure
     """
+    import matplotlib.pyplot as plt
     # Plot the center circle
     center_circle = plt.Circle((0, 0), 0.3, color=structure_color, zorder=2)
     ax.add_patch(center_circle)
 
     # Plot ticks circle with ticks at 30-degree intervals
-    for i, angle in enumerate(chromatic_angle_degrees[:-1]):
-        angle_rad = np.deg2rad(angle)
-        x_tick_start = np.cos(angle_rad) * tick_circle_radius
-        y_tick_start = np.sin(angle_rad) * tick_circle_radius
-        x_tick_end = np.cos(angle_rad) * (tick_circle_radius - tick_length)
-        y_tick_end = np.sin(angle_rad) * (tick_circle_radius - tick_length)
+    for i, (x, y) in enumerate(zip(chromatic_x, chromatic_y)):
         # Labels around the chromatic reference circle (grayed out unless active)
-        n_pos_x = np.cos(angle_rad)+np.cos(angle_rad)*(circle_radius+offset_from_circle_center)
-        n_pos_y = np.sin(angle_rad)+np.sin(angle_rad)*(circle_radius+offset_from_circle_center)
-        external_reference_label = chromatic_note_names[i]
-        ax.text(n_pos_x, n_pos_y, external_reference_label, ha='center', va='center', color='dimgray', fontsize=12, weight='bold')
-
-        ax.plot([x_tick_start, x_tick_end], [y_tick_start, y_tick_end], color='dimgray', linewidth=4)
+        ax.text(x * label_distance, y * label_distance, chromatic_note_names[i], ha='center', va='center', color='dimgray', fontsize=12, weight='bold')
+        ax.plot([x * tick_circle_radius, x * (tick_circle_radius - tick_length)], [y * tick_circle_radius, y * (tick_circle_radius - tick_length)], color='dimgray', linewidth=4)
     tick_circle = plt.Circle((0,0), tick_circle_radius, zorder=0, edgecolor='dimgray', lw=4)
     tick_circle.set_facecolor('grey')
     ax.add_patch(tick_circle)
 
-# Function to update the plot for each frame of the animation
-def update(frame):
-    """Function to update the plot for each frame of the animation
+def _ensure_note_artists(count):
+    """Creates the missing note artists so that at least count notes can be drawn"""
+    import matplotlib.pyplot as plt
+    while len(note_artists) < count:
+        spoke, = ax.plot([0, 0], [0, 0], color=structure_color, lw=10, zorder=1)
+        circle = plt.Circle((0, 0), circle_radius, zorder=2, edgecolor=structure_color, lw=1)
+        ax.add_patch(circle)
+        note_label = ax.text(0, 0, '', ha='center', va='center', color='black', fontsize=12, weight='bold')
+        interval_label = ax.text(0, 0, '', ha='center', va='center', color='black', fontsize=10, weight='bold')
+        note_artists.append((spoke, circle, note_label, interval_label))
+
+def note_circle_labels(frame):
+    """Returns the interval labels of the note circles for an animation frame
 
     Arguments:
     frame -- current frame number as passed by FuncAnimation
     """
-    ax.clear()
-
-    # Set the same figure and axis size for every frame
-    ax.set_xlim(-1.5, 1.5)
-    ax.set_ylim(-1.5, 1.5)
-
-    # plot ticks circle and center circle
-    plot_base_circles()
-
+    labels = []
     prev_pos = positions_to_plot[0]
     octave_flag = False
-
-    # Depending on ANIMATE flag, animate notes one by one or just draw them at once in one frame
-    positions_loop_list = positions_to_plot
-    for idx, pos in enumerate(positions_loop_list):
-        reversed_index = len(positions_to_plot) - pos
+    for idx, pos in enumerate(positions_to_plot):
         #If the new index is lower, this means we proceeded to the next octave
         # flag is used to add text to the label of notes on next octaves(ex.: 9th is 2+octave)
         if not octave_flag:
             if pos < prev_pos:
                 octave_flag = True
             prev_pos = pos
-        current_angle = rotated_angle_degrees[pos] % 360
-        active_external_label = rotated_chromatic_note_names[pos]
-
-        # Convert angle from degrees to radians
-        angle_rad = np.deg2rad(current_angle)
-
-        # Define line coordinates
-        x_line = [0, np.cos(angle_rad)]
-        y_line = [0, np.sin(angle_rad)]
-        # Plot the line
-        ax.plot(x_line, y_line, color=structure_color, lw=10, zorder=1)
-        # Plot a circle at the end of the line with a fixed color
-        circle = plt.Circle((np.cos(angle_rad), np.sin(angle_rad)), circle_radius, zorder=2, edgecolor=structure_color, lw=3 if idx==frame and ANIMATE else 1)
-        circle.set_facecolor(circle_colors[pos])
-        ax.add_patch(circle)
-
-        # Active labels on ticks circle
-        n_pos_x = np.cos(angle_rad)+np.cos(angle_rad)*(circle_radius+offset_from_circle_center)
-        n_pos_y = np.sin(angle_rad)+np.sin(angle_rad)*(circle_radius+offset_from_circle_center)
-        ax.text(n_pos_x, n_pos_y, active_external_label, ha='center', va='center', color='black', fontsize=12, weight='bold')
-
-        # Labels at circle centers
         if positions_to_plot.count(pos) > 1 and octave_flag and idx==frame:
-            note_circle_label = '\n\n+Octave'
+            labels.append('\n\n+Octave')
         elif octave_flag and idx==frame:
-            note_circle_label = INTERVAL_LIST[pos]+'\n+Octave'
+            labels.append(INTERVAL_LIST[pos]+'\n+Octave')
         elif octave_flag and positions_to_plot.count(pos) ==1:
-            note_circle_label = INTERVAL_LIST[pos]+'\n+Octave'
+            labels.append(INTERVAL_LIST[pos]+'\n+Octave')
         else:
-            note_circle_label = INTERVAL_LIST[pos]
-        pos_x = np.cos(angle_rad)
-        pos_y = np.sin(angle_rad)
-        ax.text(pos_x, pos_y, note_circle_label, ha='center', va='center', color='black', fontsize=10, weight='bold')
-    # Text for object name
-    ax.text(0, 0, object_name_label, ha='center', va='center', color='white', fontsize=10, weight='bold')
-    ax.set_title(object_name_label.replace('\n', ' ')+'\n', fontsize=18, weight='bold')
-    # Set aspect ratio to equal
-    ax.set_aspect('equal')
-    # Remove axes
-    ax.axis('off')
-    return ax
+            labels.append(INTERVAL_LIST[pos])
+    return labels
+
+# Function to update the plot for each frame of the animation
+def update(frame):
+    """Function to update the plot for each frame of the animation. Only updates the note artists.
+       Returns the updated artists (for blitting)
+
+    Arguments:
+    frame -- current frame number as passed by FuncAnimation
+    """
+    _ensure_note_artists(len(positions_to_plot))
+    xs = rotated_x[root_position]
+    ys = rotated_y[root_position]
+    for idx, (artists, pos, note_circle_label) in enumerate(zip(note_artists, positions_to_plot, note_circle_labels(frame))):
+        spoke, circle, note_label, interval_label = artists
+        x, y = xs[pos], ys[pos]
+        spoke.set_data([0, x], [0, y])
+        circle.center = (x, y)
+        circle.set_facecolor(circle_colors[pos])
+        circle.set_linewidth(3 if idx==frame and ANIMATE else 1)
+        # Active labels on ticks circle
+        note_label.set_position((x * label_distance, y * label_distance))
+        note_label.set_text(rotated_chromatic_note_names[pos])
+        # Labels at circle centers
+        interval_label.set_position((x, y))
+        interval_label.set_text(note_circle_label)
+    # Hide the artists of notes of a previous, longer object
+    for idx, artists in enumerate(note_artists):
+        for artist in artists:
+            artist.set_visible(idx < len(positions_to_plot))
+    # The object name is returned too, so that it stays drawn over the spokes when blitting
+    return [artist for artists in note_artists for artist in artists] + [name_text]
 
 def apply_rotations(root_name, modal_root):
     """Applies necessary rotations to the reference note and angle lists for non C roots
@@ -143,8 +166,9 @@ def apply_rotations(root_name, modal_root):
     """
     global rotated_chromatic_note_names
     global rotated_angle_degrees
+    global root_position
     # Rotations necessary to start at notes other than C
-    root_pos = chromatic_note_names.index(root_name)
+    root_pos = root_position = chromatic_note_names.index(root_name)
     modal_root_pos = chromatic_note_names.index(modal_root) # Only affects label list. Angels stay the same
     #rotate chromatic note list
     rotated_chromatic_note_names = chromatic_note_names[modal_root_pos:]+chromatic_note_names[:modal_root_pos]
@@ -164,14 +188,16 @@ def setup_parameters(notes, root, name_label):
     """
     global positions_to_plot
     global object_name_label
+    notes = as_note_array(notes)
     # Apply necessary rotations
     apply_rotations(root, notes[0].name)
-    # Set positions to plot
-    positions_to_plot = []
-    for n in notes:
-      positions_to_plot.append(rotated_chromatic_note_names.index(n.name))
+    # Set positions to plot (chromatic positions relative to the first note)
+    positions_to_plot = ((notes.pitch_classes - notes.pitch_classes[0]) % 12).tolist()
     # Set object labels
     object_name_label = name_label
+    setup_figure()
+    name_text.set_text(object_name_label)
+    ax.set_title(object_name_label.replace('\n', ' ')+'\n', fontsize=18, weight='bold')
 
 def save_plot_image(img_name):
     """Animate the chord/scale or save an image of the plot
@@ -179,9 +205,12 @@ def save_plot_image(img_name):
     Arguments:
     img_name -- name to use for the image to save
     """
+    setup_figure()
     num_lines = len(positions_to_plot)
-    update(num_lines - 1)
-    plt.savefig(img_name)
+    for artist in update(num_lines - 1):
+        # Artists left animated by a blitted animation are skipped by normal draws
+        artist.set_animated(False)
+    fig.savefig(img_name)
 
 def animate_plot(pause_length=4, single_run=True):
     """Animate the chord/scale or save an image of the plot
@@ -190,18 +219,110 @@ def animate_plot(pause_length=4, single_run=True):
     pause_length -- time to pause before clearing a plot and drawing the next, in case of looped runs
     single_run -- single run or part of a looped run. To control plot closing and delay in case of looped runs
     """
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+    setup_figure()
     num_lines = len(positions_to_plot)
-    animation = FuncAnimation(fig, update, frames=num_lines if ANIMATE else 1, interval=animation_frame_interval, blit=False, repeat=False)
+    animation = FuncAnimation(fig, update, frames=num_lines if ANIMATE else 1, interval=animation_frame_interval, blit=True, repeat=False)
     if single_run:
         plt.show()
     else:
-        # Remove axes
-        ax.axis('off')
         plt.show(block=False)
         # Adjust delay between consecutive plots/playbacks
         # non arpeggiated chords finish faster
         #pause_length = 1.2 if chord and not arp else 4
         plt.pause(pause_length)
 
+## Animation export
+###################
+# Renders the full animation headlessly: the static figure is rendered once and restored for every frame,
+# and each frame is written out as soon as it is drawn.
+class GifWriter:
+    """Writes frames to an animated GIF one at a time. All frames use the palette of the first one
+
+    Arguments:
+    path -- path of the GIF file
+    duration -- display time of each frame in milliseconds
+    loop -- number of loops. 0 to loop forever
+    """
+    def __init__(self, path, duration, loop=0):
+        self.file = open(path, 'wb')
+        self.duration = duration
+        self.loop = loop
+        self.palette = None
+
+    def write(self, image):
+        from PIL import GifImagePlugin
+        if self.palette is None:
+            self.palette = image.quantize()
+            header, _ = GifImagePlugin.getheader(self.palette, self.palette.getpalette())
+            self.file.write(b''.join(header))
+            # Netscape application extension: loop count
+            self.file.write(b'!\xff\x0bNETSCAPE2.0\x03\x01' + self.loop.to_bytes(2, 'little') + b'\x00')
+        frame = image.quantize(palette=self.palette)
+        for data in GifImagePlugin.getdata(frame, duration=self.duration):
+            self.file.write(data)
+
+    def close(self):
+        self.file.write(b';')
+        self.file.close()
+
+class PngFramesWriter:
+    """Writes frames to numbered PNG files: <stem>_000.png, <stem>_001.png..etc
+
+    Arguments:
+    stem -- path of the frame files, without the frame number and extension
+    """
+    def __init__(self, stem):
+        self.stem = stem
+        self.count = 0
+
+    def write(self, image):
+        image.save(f'{self.stem}_{self.count:03d}.png')
+        self.count += 1
+
+    def close(self):
+        pass
+
+def export_animation(path, fmt=None, frame_interval=None):
+    """Exports the full animation (one frame per note) of the current chord/scale without showing it.
+       Returns the number of frames written
+
+    Arguments:
+    path -- GIF file path, or path stem of the PNG frames
+    fmt -- 'gif' or 'png'. Defaults to 'gif' for .gif paths and 'png' otherwise
+    frame_interval -- display time of each GIF frame in milliseconds. Defaults to animation_frame_interval
+    """
+    global ANIMATE
+    from PIL import Image
+    fmt = fmt or ('gif' if path.endswith('.gif') else 'png')
+    if fmt == 'gif':
+        writer = GifWriter(path, frame_interval or animation_frame_interval)
+    elif fmt == 'png':
+        writer = PngFramesWriter(path[:-4] if path.endswith('.png') else path)
+    else:
+        raise ValueError("Invalid animation format")
+    setup_figure()
+    animate = ANIMATE
+    ANIMATE = True
+    try:
+        note_artists = update(0)
+        # Render everything but the notes once, and reuse it as the background of every frame
+        for artist in note_artists:
+            artist.set_animated(True)
+        fig.canvas.draw()
+        background = fig.canvas.copy_from_bbox(fig.bbox)
+        num_lines = len(positions_to_plot)
+        for frame in range(num_lines):
+            fig.canvas.restore_region(background)
+            for artist in sorted(update(frame), key=lambda artist: artist.get_zorder()):
+                if artist.get_visible():
+                    ax.draw_artist(artist)
+            writer.write(Image.fromarray(np.asarray(fig.canvas.buffer_rgba())[..., :3]))
+    finally:
+        ANIMATE = animate
+        writer.close()
+    return num_lines
+
 if __name__ == '__main__':
     print('Not intended for stand alone use')
@@ -1,7 +1,7 @@
 import mt_toolbox as mt
-import matplotlib.pyplot as plt
-from note import Note, basic_notes
+from note import Note, basic_notes, note_name_lookup
 import numpy as np
+from functools import lru_cache
 from basic_parser import basic_parser
 
 ## Reference lists
@@ -12,129 +12,203 @@ INTERVAL_LIST = mt.INTERVAL_LIST
 # list of chromatic note names
 CHROMATIC_NOTE_NAMES = list(mt.basic_notes.keys())
 
-## Guitar parameters
-FRET_COUNT = 24
-STRING_COUNT = 6
-GUITAR_STRING_NAMES = [Note('E', 4), Note('B', 3), Note('G', 3), Note('D', 3), Note('A', 2), Note('E', 2)] # Ordered from 1st to 6th
-# Fretboard numPy array to contain note names (or interval names)
-FRETBOARD_NP = np.empty((STRING_COUNT, FRET_COUNT+1), dtype='U10')
+## Instrument settings
+# Open string notes of each tuning, ordered from the 1st (highest) string to the lowest
+tunings = {
+    'standard' : [Note('E', 4), Note('B', 3), Note('G', 3), Note('D', 3), Note('A', 2), Note('E', 2)],
+    'drop_d' : [Note('E', 4), Note('B', 3), Note('G', 3), Note('D', 3), Note('A', 2), Note('D', 2)],
+    'dadgad' : [Note('D', 4), Note('A', 3), Note('G', 3), Note('D', 3), Note('A', 2), Note('D', 2)],
+    'open_g' : [Note('D', 4), Note('B', 3), Note('G', 3), Note('D', 3), Note('G', 2), Note('D', 2)],
+    '7_string' : [Note('E', 4), Note('B', 3), Note('G', 3), Note('D', 3), Note('A', 2), Note('E', 2), Note('B', 1)],
+    '8_string' : [Note('E', 4), Note('B', 3), Note('G', 3), Note('D', 3), Note('A', 2), Note('E', 2), Note('B', 1), Note('F#', 1)],
+    'bass' : [Note('G', 2), Note('D', 2), Note('A', 1), Note('E', 1)],
+    '5_string_bass' : [Note('G', 2), Note('D', 2), Note('A', 1), Note('E', 1), Note('B', 0)],
+}
+FRET_COUNT = 24 # Default number of frets
 # label notes with interval names instead of note names
 INTERVAL_LABELS = False
 
-def generate_fret_notes(open_string_note):
-    """Returns a list of notes existing along a string at all fret positions
+class Fretboard:
+    """Integer model of a fretted instrument: midi ids and pitch classes of every (string, fret) position,
+       and the positions of every pitch class. Build with get_fretboard, which caches one model per configuration.
 
     Arguments:
-    open_string_notes -- note object representing the note of a string
+    tuning -- name of the tuning as defined in the tunings dict
+    capo -- fret of the capo. 0 for no capo
+    first_fret -- lowest fret shown (raised to the capo fret)
+    last_fret -- highest fret shown
     """
-    fret_notes = open_string_note.get_consecutive_notes(FRET_COUNT+1)
-    return [n.name for n in fret_notes]
-
-def generate_all_notes():
-    """Populates FRETBOARD_NP with note names
-    """
-    global FRETBOARD_NP
-    # Populate the array with note names
-    for i, n in enumerate(GUITAR_STRING_NAMES):
-        FRETBOARD_NP[i, :] = generate_fret_notes(n)
-
-def show_notes(notenames):
-    """Shows the notes existing in the notenames list on a guitar fretboard
+    def __init__(self, tuning='standard', capo=0, first_fret=0, last_fret=FRET_COUNT):
+        if tuning not in tunings:
+            raise ValueError("Invalid tuning")
+        if not 0 <= capo <= last_fret or first_fret > last_fret:
+            raise ValueError("Invalid capo or fret range")
+        self.tuning = tuning
+        self.capo = capo
+        self.first_fret = max(first_fret, capo)
+        self.last_fret = last_fret
+        open_strings = np.array([n.midi_id for n in tunings[tuning]], dtype=np.int16)
+        # Fret number of each column
+        self.frets = np.arange(self.first_fret, last_fret + 1, dtype=np.int16)
+        # midi ids: strings x frets
+        self.midi_ids = open_strings[:, None] + self.frets[None, :]
+        self.pitch_classes = (self.midi_ids % 12).astype(np.int8)
+        # Positions of each pitch class as flat indexes of the matrix, in string then fret order
+        flat = self.pitch_classes.ravel()
+        order = np.argsort(flat, kind='stable')
+        bounds = np.searchsorted(flat[order], np.arange(13))
+        self.positions_by_pitch_class = [order[bounds[pc]:bounds[pc+1]] for pc in range(12)]
+
+    @property
+    def string_count(self):
+        return self.midi_ids.shape[0]
+
+    def positions(self, pitch_class):
+        """Returns the (string indexes, fret numbers) of all positions of a pitch class"""
+        strings, columns = np.divmod(self.positions_by_pitch_class[pitch_class], len(self.frets))
+        return strings, self.frets[columns]
+
+    def gather(self, pitch_classes):
+        """Returns the (string indexes, fret numbers, pitch classes) of all positions of a set of pitch classes.
+           The membership of every position is looked up in a single index gather
+
+        Arguments:
+        pitch_classes -- iterable of pitch classes (0~11)
+        """
+        member = np.zeros(12, dtype=bool)
+        member[list(pitch_classes)] = True
+        strings, columns = np.nonzero(member[self.pitch_classes])
+        return strings, self.frets[columns], self.pitch_classes[strings, columns]
+
+@lru_cache(maxsize=32)
+def get_fretboard(tuning='standard', capo=0, first_fret=0, last_fret=FRET_COUNT):
+    """Returns the Fretboard of a configuration, building it only on the first request. See Fretboard"""
+    return Fretboard(tuning, capo, first_fret, last_fret)
+
+# Fretboard in use. Changed by set_instrument
+FRETBOARD = get_fretboard()
+
+def set_instrument(tuning='standard', capo=0, first_fret=0, last_fret=FRET_COUNT):
+    """Selects the instrument configuration used for drawing. See Fretboard"""
+    global FRETBOARD
+    FRETBOARD = get_fretboard(tuning, capo, first_fret, last_fret)
+    return FRETBOARD
+
+def show_notes(pitch_classes, root_name='C'):
+    """Shows all positions of a set of notes on the fretboard
 
     Arguments:
-    notenames -- list of note names to show
+    pitch_classes -- pitch classes (0: C ~ 11: B) of the notes to show. Ex.: NoteArray.pitch_classes
+    root_name -- root note name. Note colors and interval labels are relative to it
     """
+    root_pc = CHROMATIC_NOTE_NAMES.index(note_name_lookup[root_name])
+    strings, frets, pitch_classes = FRETBOARD.gather(pitch_classes)
+    intervals = (pitch_classes - root_pc) % 12
+    colors = [NOTE_COLORS[i] for i in intervals]
+    ax.scatter(frets, strings + 1, s=0.5**2 * 1000, facecolor=colors, edgecolor=colors, zorder=2, clip_on=False) # string count starts from 1
+    for x, y, pc, interval in zip(frets.tolist(), (strings + 1).tolist(), pitch_classes.tolist(), intervals.tolist()):
+        label = INTERVAL_LIST[interval] if INTERVAL_LABELS else CHROMATIC_NOTE_NAMES[pc]
+        ax.text(x, y, label, color='black', fontsize=10, va='center', ha='center', weight='bold')
 
-    for i, n in enumerate(notenames):
-        pos_y, pos_x = np.where(FRETBOARD_NP == n)
-        pos_y += 1 # string count starts from 1
-        color = NOTE_COLORS[CHROMATIC_NOTE_NAMES.index(n)]
-        label = INTERVAL_LIST[CHROMATIC_NOTE_NAMES.index(n)] if INTERVAL_LABELS else n
-        for x, y in zip(pos_x, pos_y):
-            ax.scatter(x, y, s=0.5**2 * 1000, facecolor=color, edgecolor=color, zorder=2, clip_on=False)
-            ax.text(x, y, label, color='black', fontsize=10, va='center', ha='center', weight='bold')
-
-
-
-
-# Create a figure and axis with a dark background color
-fig, ax = plt.subplots(figsize=(16, 8))
-fig.patch.set_facecolor('#1e1e1e')  # Dark background color
-fig.canvas.manager.set_window_title('Guitar fretboard')
-# Set the limits for the plot
-ax.set_xlim(0, FRET_COUNT + 1)
-ax.set_ylim(STRING_COUNT + 0.5, 0.5)  # Reverse the Y-axis limits
 
-# Draw the frets as horizontal lines with a color close to the fretboard color
-for fret in range(1, FRET_COUNT + 1):
-    ax.axvline(fret, color='#4d4d4d', linestyle='-', linewidth=2)  # Dark gray color
 
-# Draw the strings with different thicknesses
-string_color = '#808080'  # Gray color
-string_thicknesses = [1, 1.5, 1.5, 2, 2, 3]  # Thicknesses for each string
-for string, thickness in zip(range(1, STRING_COUNT + 1), string_thicknesses):
-    ax.axhline(string, color=string_color, linestyle='-', linewidth=thickness)
 
-# Label the axes
-ax.set_xlabel('Frets', color='white')  # White text color
-ax.set_ylabel('Strings', color='white')  # White text color
+# Figure and axis. Created by draw_fretboard, since importing matplotlib is slow
+fig, ax = None, None
 
-# Set the aspect ratio to be equal
-ax.set_aspect('equal')
-
-# Set the ticks to represent the fret numbers and string numbers
-# Reverse the Y-axis ticks to reflect the string order on a guitar
-ax.set_xticks(range(1, FRET_COUNT + 1))
-ax.set_yticks(range(STRING_COUNT, 0, -1))
-
-# Set the color of the axes ticks
-ax.tick_params(axis='x', colors='white')
-ax.tick_params(axis='y', colors='white', pad=10)
-
-# Remove ticks on the top and right sides of the plot
-ax.tick_params(right=False, top=False)
-
-# Set the background color of the plot
-ax.set_facecolor('#8B4513')  # Dark background color
-
-# Draw filled circles (inlays) at specific fret positions
-inlay_frets = [3, 5, 7, 9, 15, 17, 19, 21]
-inlay_radius = 0.25  # Radius of the inlay circles
-inlay_color = 'grey'  # Color of the inlay circles
-inlay_positions = [(fret-0.5, 3.5) for fret in inlay_frets]  # Example positions for inlays
-inlay_positions = inlay_positions + [(12,2),(12,5),(24,2),(24,5)]
-ax.scatter(*zip(*inlay_positions), color=inlay_color, s=inlay_radius**2 * 1000, edgecolor='black', linewidth=1)
-generate_all_notes()
+def draw_fretboard():
+    """Creates the figure and draws the empty fretboard
+    """
+    global fig, ax
+    import matplotlib.pyplot as plt
+    # Create a figure and axis with a dark background color
+    fig, ax = plt.subplots(figsize=(16, 8))
+    fig.patch.set_facecolor('#1e1e1e')  # Dark background color
+    fig.canvas.manager.set_window_title('Guitar fretboard')
+    first_fret, last_fret, string_count = FRETBOARD.first_fret, FRETBOARD.last_fret, FRETBOARD.string_count
+    if FRETBOARD.capo and first_fret == FRETBOARD.capo:
+        # Show the fret behind the capo, where the capo is drawn
+        first_fret -= 1
+    # Set the limits for the plot
+    ax.set_xlim(first_fret, last_fret + 1)
+    ax.set_ylim(string_count + 0.5, 0.5)  # Reverse the Y-axis limits
+
+    # Draw the frets as horizontal lines with a color close to the fretboard color
+    for fret in range(first_fret + 1, last_fret + 1):
+        ax.axvline(fret, color='#4d4d4d', linestyle='-', linewidth=2)  # Dark gray color
+
+    # Draw the strings with different thicknesses
+    string_color = '#808080'  # Gray color
+    string_thicknesses = [1, 1.5, 1.5, 2, 2, 3] if string_count == 6 else np.linspace(1, 3, string_count)  # Thicknesses for each string
+    for string, thickness in zip(range(1, string_count + 1), string_thicknesses):
+        ax.axhline(string, color=string_color, linestyle='-', linewidth=thickness)
+
+    # Label the axes
+    ax.set_xlabel('Frets', color='white')  # White text color
+    ax.set_ylabel('Strings', color='white')  # White text color
+
+    # Set the aspect ratio to be equal
+    ax.set_aspect('equal')
+
+    # Set the ticks to represent the fret numbers and string numbers
+    # Reverse the Y-axis ticks to reflect the string order on a guitar
+    ax.set_xticks(range(first_fret + 1, last_fret + 1))
+    ax.set_yticks(range(string_count, 0, -1))
+
+    # Set the color of the axes ticks
+    ax.tick_params(axis='x', colors='white')
+    ax.tick_params(axis='y', colors='white', pad=10)
+
+    # Remove ticks on the top and right sides of the plot
+    ax.tick_params(right=False, top=False)
+
+    # Set the background color of the plot
+    ax.set_facecolor('#8B4513')  # Dark background color
+
+    # Draw filled circles (inlays) at specific fret positions
+    inlay_frets = [3, 5, 7, 9, 15, 17, 19, 21]
+    inlay_radius = 0.25  # Radius of the inlay circles
+    inlay_color = 'grey'  # Color of the inlay circles
+    inlay_positions = [(fret-0.5, (string_count+1)/2) for fret in inlay_frets]  # Example positions for inlays
+    inlay_positions = inlay_positions + [(fret, y) for fret in (12, 24) for y in (2, string_count-1)]
+    inlay_positions = [(x, y) for x, y in inlay_positions if first_fret < x <= last_fret]
+    if inlay_positions:
+        ax.scatter(*zip(*inlay_positions), color=inlay_color, s=inlay_radius**2 * 1000, edgecolor='black', linewidth=1)
+
+    # Draw the capo just behind its fret
+    if FRETBOARD.capo:
+        ax.axvline(FRETBOARD.capo - 0.5, color='black', linestyle='-', linewidth=10, alpha=0.8)
 
 def parse_arguments(parser, group):
     # Add arguments unique to this script
     group.add_argument('-a','--all', help='Show all notes', action ='store_true')
+    parser.add_argument('--string-tuning', choices=list(tunings), help='Tuning of the strings', default = 'standard', metavar = '')
+    parser.add_argument('--capo', choices=range(0, FRET_COUNT + 1), help='Fret of the capo', default = 0, type = int, metavar = '')
+    parser.add_argument('--frets', nargs=2, help='First and last fret to show. Ex.: 0 12', default = [0, FRET_COUNT], type = int, metavar = '')
 
     args = vars(parser.parse_args())
     return args, parser
 
 def command_processor(args, parser):
-    global CHROMATIC_NOTE_NAMES
-
     if args['mode'] != list(mt.mode_info)[0] and not args['scale']:
         parser.error("**Modes other than the default Ionian are only supported for scale commands**")
+    try:
+        set_instrument(args['string_tuning'], args['capo'], *args['frets'])
+    except ValueError as e:
+        parser.error(f"**{e}**")
 
-    root_pos = CHROMATIC_NOTE_NAMES.index(args['root'])
-    CHROMATIC_NOTE_NAMES = CHROMATIC_NOTE_NAMES[root_pos:]+CHROMATIC_NOTE_NAMES[:root_pos]
     if args['scale']:
-        scale_notes = mt.construct_scale(args['root'], args['scale'], args['mode'], 4)
-        notes = [n.name for n in scale_notes]
+        notes = mt.construct_scale_array(args['root'], args['scale'], args['mode'], 4).pitch_classes
         title = f"{args['root']} {args['mode']} of the {args['scale']} scale" if args['mode'] != 'Ionian' else f"{args['root']} {args['scale']} scale"
     elif args['chord']:
-        chord_notes = mt.construct_chord(args['root'], args['chord'], 4)
-        notes = [n.name for n in chord_notes]
+        notes = mt.construct_chord_array(args['root'], args['chord'], 4).pitch_classes
         title = f"{args['root']} {args['chord']} chord"
     elif args['note']:
-        notes = args['note']
+        notes = [CHROMATIC_NOTE_NAMES.index(note_name_lookup[args['note']])]
         title = f"{args['note']} note positions"
     elif args['all']:
         # Full fretboard
-        notes = CHROMATIC_NOTE_NAMES
+        notes = range(12)
         title = "All note positions"
 
     return notes, title
@@ -143,7 +217,9 @@ def main():
     parser, group = basic_parser('guitar.py: A script to show positions of notes, chords and scales on a graphical guitar fretboard')
     args, parser = parse_arguments(parser, group)
     notes, title = command_processor(args, parser)
-    show_notes(notes)
+    import matplotlib.pyplot as plt
+    draw_fretboard()
+    show_notes(notes, args['root'])
     # Display the plot
     plt.title(title, color='white')  # White text color for the title
     plt.show()
@@ -0,0 +1,188 @@
+import argparse
+import heapq
+import mt_toolbox as mt
+import playback as pb
+from catalog_export import iter_catalog
+
+## MIDI session export
+# Writes a whole sweep (scales, chords, progressions) into one Standard MIDI File (format 1).
+# Track 0 holds the tempo and one marker per item. Every category gets its own track and channel.
+# Events are encoded to bytes as items are added, so a session only ever holds its encoded tracks.
+
+TICKS_PER_BEAT = 960
+DRUM_CHANNEL = 9 # Skipped when assigning channels to categories
+
+def _vlq(value):
+    """Encodes an integer as a MIDI variable-length quantity"""
+    data = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        data.insert(0, (value & 0x7F) | 0x80)
+        value >>= 7
+    return data
+
+def _meta(meta_type, data):
+    """Encodes a meta event"""
+    return bytes([0xFF, meta_type]) + _vlq(len(data)) + data
+
+class _Track:
+    """Encoded MIDI track. Events must be added in increasing time order"""
+    __slots__ = ('buffer', 'tick', 'channel', '_pending', '_sounding')
+
+    def __init__(self, channel=0):
+        self.buffer = bytearray()
+        self.tick = 0
+        self.channel = channel
+        # Note offs not yet written: heap of (tick, midi_id) and latest off tick per sounding midi_id
+        self._pending = []
+        self._sounding = {}
+
+    def event(self, tick, data):
+        self.flush(tick)
+        self._write(tick, data)
+
+    def _write(self, tick, data):
+        self.buffer += _vlq(tick - self.tick)
+        self.buffer += data
+        self.tick = tick
+
+    def flush(self, tick):
+        """Writes the note offs due at or before tick"""
+        while self._pending and self._pending[0][0] <= tick:
+            off_tick, midi_id = heapq.heappop(self._pending)
+            if self._sounding.get(midi_id) == off_tick:
+                del self._sounding[midi_id]
+                self._write(off_tick, bytes((0x80 | self.channel, midi_id, 0)))
+
+    def note(self, tick, midi_id, length, velocity):
+        self.flush(tick)
+        if midi_id in self._sounding:
+            # Retrigger: end the sounding note first
+            del self._sounding[midi_id]
+            self._write(tick, bytes((0x80 | self.channel, midi_id, 0)))
+        self._write(tick, bytes((0x90 | self.channel, midi_id, velocity)))
+        self._sounding[midi_id] = tick + length
+        heapq.heappush(self._pending, (tick + length, midi_id))
+
+    def close(self):
+        """Writes the remaining note offs and the end of track event"""
+        self.flush(float('inf'))
+        self._write(self.tick, _meta(0x2F, b''))
+
+class MidiSession:
+    """Single pass writer of a sweep into one multi-track MIDI file
+
+    Arguments:
+    tempo -- tempo in BPM
+    instrument -- General MIDI program number used by all tracks
+    note_length -- length of each note in beats
+    step -- time in beats between the notes of a scale or arpeggio
+    gap -- silence in beats between items
+    volume -- note velocity (0-127)
+    """
+    def __init__(self, tempo=pb.tempo, instrument=pb.instrument, note_length=pb.duration, step=2, gap=4, volume=pb.volume):
+        self.instrument = instrument
+        self.note_length = round(note_length * TICKS_PER_BEAT)
+        self.step = round(step * TICKS_PER_BEAT)
+        self.gap = round(gap * TICKS_PER_BEAT)
+        self.volume = volume
+        self.tick = 0
+        self.item_count = 0
+        self.note_count = 0
+        self._conductor = _Track()
+        self._conductor.event(0, _meta(0x51, round(60_000_000 / tempo).to_bytes(3, 'big')))
+        self._tracks = {}
+
+    def _track(self, category):
+        """Returns the track of a category, creating it on first use"""
+        track = self._tracks.get(category)
+        if track is None:
+            channel = len(self._tracks)
+            channel += channel >= DRUM_CHANNEL
+            if channel > 15:
+                raise ValueError("Error: Too many categories for the 16 MIDI channels")
+            track = self._tracks[category] = _Track(channel)
+            track.event(0, _meta(0x03, category.encode()))
+            track.event(0, bytes((0xC0 | channel, self.instrument)))
+        return track
+
+    def add(self, category, name, notes, type='scale'):
+        """Appends an item to the session after the previous item
+
+        Arguments:
+        category -- name of the track the item goes to. Ex.: 'scales'
+        name -- marker text of the item. Ex.: 'C Major'
+        notes -- list of Note objects or NoteArray
+        type -- 'scale' to play the notes one after the other, 'chord' to play them together,
+                'arp' to play them one after the other and then together
+        """
+        if type not in ('scale', 'chord', 'arp'):
+            raise ValueError("Invalid item type")
+        midi_ids = mt.as_note_array(notes).midi_ids.tolist()
+        track = self._track(category)
+        self._conductor.event(self.tick, _meta(0x06, name.encode()))
+        tick = self.tick
+        if type in ('scale', 'arp'):
+            for midi_id in midi_ids:
+                track.note(tick, midi_id, self.note_length, self.volume)
+                tick += self.step
+        if type in ('chord', 'arp'):
+            if type == 'arp':
+                tick += self.step
+            for midi_id in midi_ids:
+                track.note(tick, midi_id, self.note_length, self.volume)
+            tick += self.step
+        self.tick = tick - self.step + self.note_length + self.gap
+        self.item_count += 1
+        self.note_count += len(midi_ids) * (2 if type == 'arp' else 1)
+
+    def write(self, file):
+        """Closes the session and writes it as a Standard MIDI File
+
+        Arguments:
+        file -- path or binary file object
+        """
+        if isinstance(file, str):
+            with open(file, 'wb') as f:
+                return self.write(f)
+        tracks = [self._conductor, *self._tracks.values()]
+        for track in tracks:
+            if not track.buffer.endswith(_meta(0x2F, b'')):
+                track.close()
+        file.write(b'MThd' + (6).to_bytes(4, 'big') + (1).to_bytes(2, 'big') + len(tracks).to_bytes(2, 'big') + TICKS_PER_BEAT.to_bytes(2, 'big'))
+        for track in tracks:
+            file.write(b'MTrk' + len(track.buffer).to_bytes(4, 'big'))
+            file.write(track.buffer)
+
+def export_session(path, tempo=pb.tempo, instrument=pb.instrument, **kwargs):
+    """Writes scales and chords of the catalog into one MIDI file, with a 'scales' and a 'chords' track.
+       Returns the session.
+
+    Arguments:
+    path -- output .mid file path
+    tempo -- tempo in BPM
+    instrument -- General MIDI program number
+    kwargs -- passed to catalog_export.iter_catalog (roots, octaves, scales, chords)
+    """
+    session = MidiSession(tempo=tempo, instrument=instrument)
+    for record in iter_catalog(**kwargs):
+        name = f"{record['root']} {record['name']}" + (f" ({record['mode']})" if record['mode'] not in (None, 'Ionian') else '')
+        session.add(record['type'] + 's', name, mt.NoteArray(record['midi_ids']), record['type'])
+    session.write(path)
+    return session
+
+def main():
+    parser = argparse.ArgumentParser(description='midi_session.py: Export all scales and chords to a single multi-track MIDI file')
+    parser.add_argument('path', help='Output file path (.mid)')
+    parser.add_argument('-o','--octaves', nargs='+', choices=[i for i in range(0, 9)], help='Octaves to export', default = [4], type = int, metavar = '')
+    parser.add_argument('-r','--roots', nargs='+', choices=list(mt.basic_notes), help='Root notes to export. Defaults to all', metavar = '')
+    parser.add_argument('--tempo', help='Tempo in BPM', default = pb.tempo, type = int, metavar = '')
+    parser.add_argument('--instrument', choices=range(0, 128), help='General MIDI program number (0~127)', default = pb.instrument, type = int, metavar = '')
+    parser.add_argument('--no-scales', help='Do not export scales', action ='store_true')
+    parser.add_argument('--no-chords', help='Do not export chords', action ='store_true')
+    args = parser.parse_args()
+    session = export_session(args.path, args.tempo, args.instrument, roots=args.roots, octaves=args.octaves, scales=not args.no_scales, chords=not args.no_chords)
+    print(f'Exported {session.item_count} items ({session.note_count} notes) to {args.path}')
+
+if __name__ == '__main__':
+    main()
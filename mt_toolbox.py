@@ -1,7 +1,12 @@
 import re
-from note import Note
-from note import basic_notes
-import random
+import math
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+from note import Note, NoteArray, as_note_array
+from note import basic_notes, note_name_lookup, NOTE_NAMES as note_names
+from note import set_tuning, tuning_systems, A4_FREQUENCY
+from note import MIN_MIDI_ID, MAX_MIDI_ID
+# numpy is imported by the functions that need it, so that listing and printing start fast
 S = 2**(1/12) # Semi-tone frequency multiplier
 T = S ** 2 # Full-tone frequency multiplier
 # Mode info
@@ -117,6 +122,151 @@ https://github.com/aq-amani/music-theory
 /////////////////////////////
 """
 
+def signature_to_steps(signature):
+    """Returns a list of half step counts from a list of tone/semitone (T, S) signature values
+       Ex.: [T,T,S] becomes [2,2,1]
+
+    Arguments:
+    signature -- a list of tone/semitone values representing a scale signature
+    """
+    return [round(12 * math.log2(s)) for s in signature]
+
+# Scale signatures as half step counts
+scale_steps = {scale_name: signature_to_steps(info['signature']) for scale_name, info in all_scale_info.items()}
+# Labels of half step counts when printing scale signatures
+step_labels = {1: 'S', 2: 'T', 3: 'T.S'}
+
+def register_scale(scale_name, steps, info='', mask=None):
+    """Adds a scale to all_scale_info
+
+    Arguments:
+    scale_name -- name of the scale
+    steps -- list of half step counts between consecutive notes, including the last note to next octave step. Ex.: [2,2,1,2,2,2,1]
+    info -- description of the scale
+    mask -- precompiled pitch class mask of the scale (see theory_packs). Computed from steps if None
+    """
+    all_scale_info[scale_name] = {"signature" : [S ** n for n in steps], "info" : info}
+    scale_steps[scale_name] = list(steps)
+    scale_masks[scale_name] = mask if mask is not None else positions_to_mask(steps_to_positions(steps))
+    invalidate_caches()
+
+def register_chord(chord_name, signature, info='', offsets=None, mask=None):
+    """Adds a chord to all_chord_info
+
+    Arguments:
+    chord_name -- name of the chord
+    signature -- list of intervals respective to the major scale. Ex.: [1,'m3',5]
+    info -- description of the chord
+    offsets -- precompiled half steps of every interval from the root (see theory_packs). Parsed from signature if None
+    mask -- precompiled pitch class mask of the chord. Computed from offsets if None
+    """
+    all_chord_info[chord_name] = {"signature" : list(signature), "info" : info}
+    chord_offsets[chord_name] = list(offsets) if offsets is not None else [parse_interval(i).semitone_offset for i in signature]
+    chord_masks[chord_name] = mask if mask is not None else positions_to_mask(chord_offsets[chord_name])
+    invalidate_caches()
+
+def invalidate_caches():
+    """Empties every cache derived from all_scale_info and all_chord_info. Call after modifying them"""
+    global _compatibility, _chord_index, _scale_index
+    catalog.clear()
+    _compatibility = None
+    _chord_index = None
+    _scale_index = None
+    _find_scales_by_mask.cache_clear()
+    get_key_harmonization.cache_clear()
+
+class TheoryCatalog:
+    """Memoized catalog of constructed scales and chords.
+       Each (root, scale, mode, octave) and (root, chord, octave) combination is constructed once
+       and kept in an LRU cache bounded to maxsize entries. Lookups return tuples of Note objects,
+       or NoteArrays for the *_array lookups.
+    """
+
+    def __init__(self, maxsize=16384):
+        """Arguments:
+        maxsize -- maximum number of scales and chords to keep in the cache
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def _lookup(self, key, builder, *args):
+        try:
+            notes = self._cache[key]
+        except KeyError:
+            self.misses += 1
+            notes = builder(*args)
+            if not isinstance(notes, NoteArray):
+                notes = tuple(notes)
+            self._cache[key] = notes
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+            return notes
+        self.hits += 1
+        self._cache.move_to_end(key)
+        return notes
+
+    def scale(self, root_name, scale_name, mode_name='Ionian', octave=4):
+        """Returns the notes of a scale as a tuple of Note objects (see construct_scale)"""
+        root_name = note_alt_name_converter(root_name)
+        key = ('scale', root_name, scale_name, mode_name, octave)
+        return self._lookup(key, _build_scale, root_name, scale_name, mode_name, octave, None)
+
+    def chord(self, root_name, chord_name, octave=4):
+        """Returns the notes of a chord as a tuple of Note objects (see construct_chord)"""
+        root_name = note_alt_name_converter(root_name)
+        key = ('chord', root_name, chord_name, octave)
+        return self._lookup(key, _build_chord, root_name, chord_name, octave)
+
+    def scale_array(self, root_name, scale_name, mode_name='Ionian', octave=4):
+        """Returns the notes of a scale as a NoteArray (see construct_scale_array)"""
+        root_name = note_alt_name_converter(root_name)
+        key = ('scale_array', root_name, scale_name, mode_name, octave)
+        return self._lookup(key, _build_scale_array, root_name, scale_name, mode_name, octave)
+
+    def chord_array(self, root_name, chord_name, octave=4):
+        """Returns the notes of a chord as a NoteArray (see construct_chord_array)"""
+        root_name = note_alt_name_converter(root_name)
+        key = ('chord_array', root_name, chord_name, octave)
+        return self._lookup(key, _build_chord_array, root_name, chord_name, octave)
+
+    def precompute(self, octaves=range(0, 9)):
+        """Fills the cache with every scale, mode and chord at every root for the given octaves
+           Combinations that exceed the supported octave range are skipped.
+
+        Arguments:
+        octaves -- octaves at which to construct the scales and chords
+        """
+        for octave in octaves:
+            for root_name in basic_notes:
+                for scale_name, steps in scale_steps.items():
+                    for mode_name in (mode_info if len(steps) == 7 else ['Ionian']):
+                        try:
+                            self.scale(root_name, scale_name, mode_name, octave)
+                        except ValueError:
+                            pass
+                for chord_name in all_chord_info:
+                    try:
+                        self.chord(root_name, chord_name, octave)
+                    except ValueError:
+                        pass
+
+    def cache_info(self):
+        """Returns a dict of cache statistics"""
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache),
+                'maxsize': self.maxsize, 'hit_rate': self.hits / total if total else 0.0}
+
+    def clear(self):
+        """Empties the cache and resets the statistics"""
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+# Default catalog used by construct_scale and construct_chord
+catalog = TheoryCatalog()
+
 def construct_scale(root_name, scale_name, mode_name, octave=4, scale_length=None):
     """Construct a musical scale from a root note
 
@@ -126,24 +276,50 @@ def construct_scale(root_name, scale_name, mode_name, octave=4, scale_length=Non
     mode_name -- name of the musical mode mode as defined in the mode_info dict, in which to play the chord (Ionian, Dorian..etc)
     scale_length -- Defaults to standard scale length. Specify when needing non-standard scale length (ex.: span multiple octaves)
     """
-    root_note = Note(root_name, octave) if root_name != 'all' else 'all'
-    scale_signature = all_scale_info[scale_name]['signature'] if scale_name != 'all' else 'all'
+    if not scale_length:
+        return list(catalog.scale(root_name, scale_name, mode_name, octave))
+    return _build_scale(root_name, scale_name, mode_name, octave, scale_length)
+
+def _build_scale(root_name, scale_name, mode_name, octave, scale_length):
+    """Builds the list of scale notes. See construct_scale"""
+    root_note = Note(root_name, octave)
+    steps = scale_steps[scale_name]
     if not scale_length:
         # If not specified, default to standard scale length
-        scale_length = len(scale_signature) + 1
+        scale_length = len(steps) + 1
     if mode_name != 'Ionian':
-        if len(scale_signature) != 7:
+        if len(steps) != 7:
             raise ValueError("Error: Modes not supported for non-heptatonic scales")
-        scale_signature = get_modal_scale_signature(scale_name, mode_name)
+        steps = get_rotated_signature(steps, mode_info[mode_name])
     scale_notes = [root_note]
-    note = root_note
+    midi_id = root_note.midi_id
     for i in range(scale_length - 1):
-        halfstep_count = 1 if scale_signature[i % len(scale_signature)] == S else 2 if scale_signature[i % len(scale_signature)] == T else 3
-        note = note.get_next_step_note(halfstep_count)
-        scale_notes.append(note)
+        midi_id += steps[i % len(steps)]
+        scale_notes.append(Note.from_midi(midi_id))
 
     return scale_notes
 
+def construct_scale_array(root_name, scale_name, mode_name, octave=4):
+    """Construct a musical scale from a root note as a NoteArray, without going through Note objects
+
+    Arguments:
+    root_name -- name of root note
+    scale_name -- name of the scale
+    mode_name -- name of the musical mode mode as defined in the mode_info dict (Ionian, Dorian..etc)
+    octave -- octave of the root note
+    """
+    return catalog.scale_array(root_name, scale_name, mode_name, octave)
+
+def _build_scale_array(root_name, scale_name, mode_name, octave):
+    """Builds the NoteArray of a scale. See construct_scale_array"""
+    import numpy
+    steps = scale_steps[scale_name]
+    if mode_name != 'Ionian':
+        if len(steps) != 7:
+            raise ValueError("Error: Modes not supported for non-heptatonic scales")
+        steps = get_rotated_signature(steps, mode_info[mode_name])
+    return NoteArray(Note(root_name, octave).midi_id + numpy.cumsum([0] + steps))
+
 def construct_chord(root_name, chord_name, octave=4):
     """Construct a wave from a combination of simultaneous notes(chord)
 
@@ -151,17 +327,83 @@ def construct_chord(root_name, chord_name, octave=4):
     root_name -- name of root note
     chord_name -- name of the chord
     """
-    root_note = Note(root_name, octave) if root_name != 'all' else 'all'
-    chord_signature = all_chord_info[chord_name]['signature'] if chord_name != 'all' else 'all'
-    base_scale_notes = construct_scale(root_name, 'Major', 'Ionian', octave, 9)
+    return list(catalog.chord(root_name, chord_name, octave))
+
+def _build_chord(root_name, chord_name, octave):
+    """Builds the list of chord notes. See construct_chord"""
+    root_note = Note(root_name, octave)
     chord_notes = []
 
-    for index in chord_signature:
-        index_s = int(re.findall(r'\d+', index)[0]) if type(index) is str else index
-        note = note_modifier(index, base_scale_notes[index_s-1])
-        chord_notes.append(note)
+    for offset in chord_offsets[chord_name]:
+        chord_notes.append(Note.from_midi(root_note.midi_id + offset))
     return chord_notes
 
+def construct_chord_array(root_name, chord_name, octave=4):
+    """Construct a chord from a root note as a NoteArray, without going through Note objects
+
+    Arguments:
+    root_name -- name of root note
+    chord_name -- name of the chord
+    octave -- octave of the root note
+    """
+    return catalog.chord_array(root_name, chord_name, octave)
+
+def _build_chord_array(root_name, chord_name, octave):
+    """Builds the NoteArray of a chord. See construct_chord_array"""
+    import numpy
+    return NoteArray(Note(root_name, octave).midi_id + numpy.array(chord_offsets[chord_name]))
+
+class Interval(namedtuple('Interval', ['degree', 'semitone_offset'])):
+    """A compiled interval token
+       degree -- position on the (extended) major scale as written in the token. Ex.: 9 for 'b9'
+       semitone_offset -- half steps between the root and the interval. Ex.: 13 for 'b9'
+    """
+    __slots__ = ()
+
+    @property
+    def modifier(self):
+        """Half steps by which the interval is sharpened(+) or flattened(-) relative to the major scale degree"""
+        return self.semitone_offset - major_degree_offset(self.degree)
+
+    @property
+    def position(self):
+        """Chromatic position of the interval within one octave (0~11)"""
+        return self.semitone_offset % 12
+
+def major_degree_offset(degree):
+    """Returns the half steps between the root and a degree of the major scale, counting past the octave
+       Ex.: 3 returns 4, 9 returns 14
+    """
+    return 12 * ((degree - 1) // 7) + interval_to_position_map[(degree - 1) % 7 + 1]
+
+@lru_cache(maxsize=None)
+def parse_interval(token):
+    """Compiles an interval token into an Interval record. Results are cached, so each token is parsed once.
+       modifiers: m(minor),b(flat),D(diminished)--> -1,
+                  A(augmented), # (sharp)--> +1,
+                  M(major),P(Perfect)--> 0 (number as is)
+       # and b can be repeated. Ex.: bb7 --> -2
+
+    Arguments:
+    token -- an int (ex.: 5) or a string interval name (ex.: 'm3', 'P5', 'A4', '#4', 'b9')
+    """
+    if type(token) is int:
+        degree, modifier = token, 0
+    else:
+        # Modifiers before the degree, or # and b after it (ex.: '5#')
+        match = re.fullmatch(r'[mbDA#MP]*(\d+)[#b]*', token) if isinstance(token, str) else None
+        if match is None:
+            raise ValueError(f"Invalid interval: {token}")
+        degree = int(match.group(1))
+        modifier = token.count('#') - token.count('b')
+        if 'm' in token or 'D' in token:
+            modifier -= 1
+        elif 'A' in token:
+            modifier += 1
+    if degree < 1:
+        raise ValueError(f"Invalid interval: {token}")
+    return Interval(degree, major_degree_offset(degree) + modifier)
+
 def note_modifier(note_index, note):
     """Returns a modified Note object after sharpening or flattening the note based on # or b modifiers
        modifiers: m(minor),b(flat),D(diminished)--> -1,
@@ -171,15 +413,7 @@ def note_modifier(note_index, note):
     note_index -- Note position index on the major scale
     note -- Note object to flatten or to sharpen
     """
-    modifier = 0
-    if type(note_index) is str:
-        i = int(re.findall(r'\d+', note_index)[0])
-        if 'b' in note_index  or 'm' in note_index or 'D' in note_index:
-           modifier = -1
-        elif '#' in note_index or 'A' in note_index:
-           modifier = 1
-    modified_note = note.get_next_step_note(modifier)
-    return modified_note
+    return note.get_next_step_note(parse_interval(note_index).modifier)
 
 def unify_signature_format(signature):
     """Unify interval names in signatures to match the INTERVAL_LIST format
@@ -189,30 +423,7 @@ def unify_signature_format(signature):
     signature -- list of interval names representing a signature to unify-format
     """
 
-    unified_format_signature = []
-    for interval in signature:
-        # First check if the naming already matches the reference list
-        # If it does, add it as is
-        if interval in INTERVAL_LIST:
-            unified_format_signature.append(interval)
-            continue
-        if type(interval) is str:
-            n = re.findall(r'\d+', interval)[0]
-            if 'D' in interval or 'b' in interval:
-                main_index = INTERVAL_LIST.index(n)
-                modified = INTERVAL_LIST[main_index-1]
-            if 'P' in interval:
-                modified = n
-            if '#' in interval or ('A' in interval and interval != 'A4'):
-                main_index = INTERVAL_LIST.index(n)
-                modified = INTERVAL_LIST[(main_index+1)%12]
-        else:
-            # normalize intervals exceeding an octave
-            if interval > 7:
-                interval = interval%7
-            modified = str(interval)
-        unified_format_signature.append(modified)
-    return unified_format_signature
+    return [INTERVAL_LIST[parse_interval(interval).position] for interval in signature]
 
 def intervals_to_chrom_positions(intervals):
     """Returns a list of chromatic positions from a list of musical intervals(m2,P5..)
@@ -223,22 +434,8 @@ def intervals_to_chrom_positions(intervals):
     Arguments:
     intervals -- a list of intervals. ex.: ['1','m3','P5']
     """
-    positions = []
-    for i in intervals:
-        modifier = 0
-        if type(i) is str:
-            n = int(re.findall(r'\d+', i)[0])
-            if 'b' in i or 'm' in i or 'D' in i:
-               modifier = -1
-            elif '#' in i or 'A' in i:
-               modifier = 1
-        else:
-            n = i
-        # if intervals exceeding one octave were provided restart counting at 1
-        if n > 7:
-            n = n%7
-        positions.append(interval_to_position_map[n] + modifier)
-    return positions
+    # intervals exceeding one octave restart counting at 1
+    return [parse_interval(i).position for i in intervals]
 
 def tone_to_chrom_positions(signature):
     """Returns a list of chromatic positions from a list of tone,semitone (T, S) signatures
@@ -250,15 +447,8 @@ def tone_to_chrom_positions(signature):
     positions = []
     positions.append(pos)
     # exclude the last interval (last note- next octave first note interval)
-    for i in signature[:-1]:
-        if i == S:
-            pos += 1
-        elif i == T:
-            pos += 2
-        elif i == T*S:
-            pos += 3
-        else:
-            print('Error. Unexpected signature element.')
+    for step in signature_to_steps(signature[:-1]):
+        pos += step
         positions.append(pos)
     return positions
 
@@ -275,6 +465,91 @@ def positions_to_intervals(positions):
         intervals.append(INTERVAL_LIST[p])
     return intervals
 
+## Pitch class masks
+# A set of chromatic positions (0~11) is represented as a 12 bit int where bit p is set if position p is included
+# Ex.: Major triad [0, 4, 7] --> 0b000010010001
+FULL_MASK = 0xFFF
+
+def positions_to_mask(positions):
+    """Returns a 12 bit pitch class mask from a list of chromatic positions"""
+    mask = 0
+    for p in positions:
+        mask |= 1 << (p % 12)
+    return mask
+
+def steps_to_positions(steps):
+    """Returns the chromatic positions of the notes of a scale from its half step counts
+       Ex.: [2,2,1,2,2,2,1] becomes [0,2,4,5,7,9,11]
+    """
+    return [sum(steps[:i]) for i in range(len(steps))]
+
+def mask_to_positions(mask):
+    """Returns the sorted list of chromatic positions (0~11) included in a pitch class mask"""
+    return [p for p in range(12) if mask >> p & 1]
+
+# Half steps from the root of every chord interval, and pitch class masks of scales (relative to their first degree) and chords.
+# Compiled once here for the built-in definitions, and by register_scale/register_chord for added ones
+chord_offsets = {chord_name: [parse_interval(i).semitone_offset for i in info['signature']] for chord_name, info in all_chord_info.items()}
+scale_masks = {scale_name: positions_to_mask(steps_to_positions(steps)) for scale_name, steps in scale_steps.items()}
+chord_masks = {chord_name: positions_to_mask(offsets) for chord_name, offsets in chord_offsets.items()}
+
+def rotate_mask(mask, n):
+    """Returns the mask transposed so that position n becomes position 0
+       Ex.: rotating the C major scale mask by 2 gives the mask of its intervals relative to D (Dorian)
+    """
+    n %= 12
+    return ((mask >> n) | (mask << (12 - n))) & FULL_MASK
+
+def mask_is_subset(mask, other):
+    """Returns True if all positions of mask are included in other"""
+    return mask & ~other & FULL_MASK == 0
+
+def mask_union(mask, other):
+    return mask | other
+
+def mask_distance(mask, other):
+    """Returns the number of positions included in only one of the two masks"""
+    return bin(mask ^ other).count('1')
+
+def scale_mask(scale_name, degree=1):
+    """Returns the pitch class mask of a scale relative to one of its degrees
+
+    Arguments:
+    scale_name -- name of scale
+    degree -- int representing the degree of the scale to use as position 0
+    """
+    mask = scale_masks[scale_name]
+    return rotate_mask(mask, mask_to_positions(mask)[degree-1])
+
+def chord_mask(chord_name):
+    """Returns the pitch class mask of a chord relative to its root"""
+    return chord_masks[chord_name]
+
+# Cached compatibility tensor and its axes. See get_chord_compatibility_tensor
+_compatibility = None
+
+def get_chord_compatibility_tensor():
+    """Returns (tensor, scale_names, chord_names) where tensor is a boolean numpy array of shape
+       (scales, 12 degrees, chords). tensor[s, d, c] is True if chord c fits on degree d+1 of scale s.
+       Degrees beyond the length of a scale are always False.
+       Computed once, in a single vectorized pass over all scales, degrees and chords.
+    """
+    global _compatibility
+    import numpy
+    if _compatibility is None:
+        scale_names = list(all_scale_info)
+        chord_names = list(all_chord_info)
+        degree_masks = numpy.zeros((len(scale_names), 12), dtype=numpy.int32)
+        for i, scale_name in enumerate(scale_names):
+            degree_count = len(all_scale_info[scale_name]['signature'])
+            degree_masks[i, :degree_count] = [scale_mask(scale_name, d) for d in range(1, degree_count+1)]
+        chord_masks = numpy.array([chord_mask(c) for c in chord_names], dtype=numpy.int32)
+        tensor = (chord_masks[None, None, :] & ~degree_masks[:, :, None] & FULL_MASK) == 0
+        tensor &= degree_masks[:, :, None] != 0
+        tensor.setflags(write=False)
+        _compatibility = (tensor, scale_names, chord_names)
+    return _compatibility
+
 def get_possible_chords_for_degree(scale_name, degree):
     """Return possible chord types for a scale degree
 
@@ -282,15 +557,10 @@ def get_possible_chords_for_degree(scale_name, degree):
     scale_name -- name of scale
     degree -- int representing the degree of the scale
     """
-    possible_chords = []
-    intervals = get_scale_degree_intervals(scale_name, degree)
-    for chord_name in all_chord_info:
-        chord_sig = all_chord_info[chord_name]['signature']
-        # unify signature format
-        chord_sig = unify_signature_format(chord_sig)
-        if set(chord_sig).issubset(set(intervals)):
-            possible_chords.append(chord_name)
-    return possible_chords
+    import numpy
+    tensor, scale_names, chord_names = get_chord_compatibility_tensor()
+    row = tensor[scale_names.index(scale_name), degree-1]
+    return [chord_names[i] for i in numpy.flatnonzero(row)]
 
 def get_possible_chord_matrix(scale_name):
     """Return a matrix (list of list)of all possible chords of scale
@@ -299,12 +569,144 @@ def get_possible_chord_matrix(scale_name):
     Arguments:
     scale_name -- name of scale
     """
+    import numpy
+    tensor, scale_names, chord_names = get_chord_compatibility_tensor()
+    scale_rows = tensor[scale_names.index(scale_name), :len(all_scale_info[scale_name]['signature'])]
+    return [[chord_names[i] for i in numpy.flatnonzero(row)] for row in scale_rows]
 
-    signature = all_scale_info[scale_name]['signature']
-    all_degree_possible_chords = []
-    for degree in range(1,len(signature)+1):
-        all_degree_possible_chords.append(get_possible_chords_for_degree(scale_name, degree))
-    return all_degree_possible_chords
+## Reverse chord identification
+# A chord identified from a set of notes
+# chord_name -- key in all_chord_info | root -- root note name | bass -- lowest note name
+# inversion -- index of the bass note within the chord tones (0 for root position), None if the bass is not a chord tone
+# distance -- number of pitch classes in only one of the query and the chord (0 for an exact match)
+ChordMatch = namedtuple('ChordMatch', ['chord_name', 'root', 'inversion', 'bass', 'distance'])
+
+# Cached index of absolute pitch class masks to chord entries. See get_chord_index
+_chord_index = None
+
+def get_chord_index():
+    """Returns a dict mapping the pitch class mask of every chord at every root (0: C ~ 11: B)
+       to a list of (root position, chord name, chord tone positions, chord order) entries. Built once.
+    """
+    global _chord_index
+    if _chord_index is None:
+        _chord_index = {}
+        for order, chord_name in enumerate(all_chord_info):
+            mask = chord_mask(chord_name)
+            # Unique chord tone positions in signature order
+            chord_tones = tuple(dict.fromkeys(o % 12 for o in chord_offsets[chord_name]))
+            for root_pos in range(12):
+                entry = (root_pos, chord_name, chord_tones, order)
+                _chord_index.setdefault(rotate_mask(mask, -root_pos), []).append(entry)
+    return _chord_index
+
+def _note_to_midi_id(note):
+    """Returns a midi id from a midi id, a Note object or a note name (names are placed at octave 4)"""
+    if isinstance(note, Note):
+        return note.midi_id
+    if isinstance(note, str):
+        return Note(note, 4).midi_id
+    return int(note)
+
+def identify_chord(notes, max_distance=0):
+    """Returns the chords matching a set of notes as a list of ChordMatch, closest matches first.
+       Matches are looked up in a precomputed index of all chords at all roots,
+       including chords that differ from the notes by up to max_distance pitch classes.
+
+    Arguments:
+    notes -- list of midi ids, note names or Note objects. The lowest midi id is the bass.
+             Note names carry no octave, so the first name is taken as the bass.
+    max_distance -- maximum number of missing or extra pitch classes
+    """
+    midi_ids = [_note_to_midi_id(n) for n in notes]
+    if not midi_ids:
+        return []
+    if isinstance(notes[0], str):
+        bass_pos = midi_ids[0] % 12
+    else:
+        bass_pos = min(midi_ids) % 12
+    index = get_chord_index()
+    # Every mask within max_distance bit flips of the query
+    candidates = {positions_to_mask(midi_ids): 0}
+    for distance in range(1, max_distance+1):
+        for mask in list(candidates):
+            for p in range(12):
+                candidates.setdefault(mask ^ (1 << p), distance)
+    ranked = []
+    for mask, distance in candidates.items():
+        for root_pos, chord_name, chord_tones, order in index.get(mask, ()):
+            bass_interval = (bass_pos - root_pos) % 12
+            inversion = chord_tones.index(bass_interval) if bass_interval in chord_tones else None
+            match = ChordMatch(chord_name, note_names[root_pos], inversion, note_names[bass_pos], distance)
+            ranked.append(((distance, inversion is None, inversion or 0, order), match))
+    ranked.sort(key=lambda r: r[0])
+    return [match for _, match in ranked]
+
+def identify_chords(clusters, max_distance=0):
+    """Returns a list of identify_chord results, one per note cluster
+
+    Arguments:
+    clusters -- iterable of note lists (midi ids, note names or Note objects)
+    max_distance -- maximum number of missing or extra pitch classes
+    """
+    return [identify_chord(c, max_distance) for c in clusters]
+
+## Scale lookup
+# A scale containing a set of notes
+# root -- root note name of the (modal) scale | scale_name -- key in all_scale_info
+# mode_name -- key in mode_info for heptatonic scales, None for rotations of other scales
+# degree -- degree of the parent scale the mode starts at (1 for the scale itself)
+# extra_notes -- number of scale notes not in the query
+ScaleMatch = namedtuple('ScaleMatch', ['root', 'scale_name', 'mode_name', 'degree', 'extra_notes'])
+
+# Cached inverted index of scales by pitch class. See get_scale_index
+_scale_index = None
+
+def get_scale_index():
+    """Returns (matches, note_counts, postings) for every root x scale x mode (every rotation for non-heptatonic scales),
+       sorted by note count. matches[i][k] is the ScaleMatch of entry i with k extra notes, note_counts[i] its
+       number of notes, and postings is a (12, entries) bool array: postings[p, i] is True if entry i contains
+       pitch class p (0: C ~ 11: B). Built once.
+    """
+    global _scale_index
+    if _scale_index is None:
+        import numpy
+        mode_names = list(mode_info)
+        entries = []
+        for scale_name, steps in scale_steps.items():
+            for degree in range(1, len(steps)+1):
+                mode_name = mode_names[degree-1] if len(steps) == 7 else None
+                mask = scale_mask(scale_name, degree)
+                for root_pos in range(12):
+                    entries.append((rotate_mask(mask, -root_pos), ScaleMatch(note_names[root_pos], scale_name, mode_name, degree, 0)))
+        # sort by note count so that matches come fewest extra notes first
+        entries.sort(key=lambda e: bin(e[0]).count('1'))
+        note_counts = [bin(mask).count('1') for mask, _ in entries]
+        # every extra_notes variant of each match is built here, so that queries only pick them
+        matches = [tuple(match._replace(extra_notes=k) for k in range(count+1)) for (_, match), count in zip(entries, note_counts)]
+        masks = numpy.array([mask for mask, _ in entries])
+        postings = (masks >> numpy.arange(12).reshape(-1, 1) & 1).astype(bool)
+        _scale_index = (matches, note_counts, postings)
+    return _scale_index
+
+@lru_cache(maxsize=4096)
+def _find_scales_by_mask(query):
+    """Returns a tuple of ScaleMatch for every scale containing all pitch classes of the query mask"""
+    import numpy
+    matches, note_counts, postings = get_scale_index()
+    positions = mask_to_positions(query)
+    hits = numpy.flatnonzero(postings[positions].all(axis=0)).tolist()
+    query_count = len(positions)
+    return tuple([matches[i][note_counts[i] - query_count] for i in hits])
+
+def find_scales(notes):
+    """Returns every (root, scale, mode) containing all of the notes as a list of ScaleMatch,
+       fewest extra notes first. Answers come from an inverted index of pitch classes to scales.
+
+    Arguments:
+    notes -- list of midi ids, note names or Note objects
+    """
+    return list(_find_scales_by_mask(positions_to_mask(_note_to_midi_id(n) for n in notes)))
 
 def get_scale_degree_intervals(scale_name, degree):
     """Return a list of intervals with reference to a specific degree
@@ -340,10 +742,9 @@ def print_chord(root_name, chord_name, chord_notes):
 
 def print_scale(root_name, scale_name, scale_notes, mode='Ionian'):
     """Prints the scale information in a nicely formatted string"""
-    scale_signature = all_scale_info[scale_name]['signature']
     positions = '|'.join(f'{str(i):^7}' for i in range(1,len(scale_notes)+1))
     note_names = '|'.join(f'{note_alt_name_appender(n.name):^7}' for n in scale_notes)
-    signature = '--|--'.join(f'{"S" if s == S else "T" if s==T else "T.S":^3}' for s in scale_signature)
+    signature = '--|--'.join(f'{step_labels.get(s, str(s)):^3}' for s in scale_steps[scale_name])
     lines = '+'.join(f'{"-------":7}' for n in scale_notes)
     print(
     f'|\n|_{note_alt_name_appender(root_name)} {mode}' if mode != 'Ionian' else f'|\n|_{note_alt_name_appender(root_name)}',
@@ -364,7 +765,7 @@ def print_note_info(octave):
     start_note = Note('C', octave)
     note_list = start_note.get_consecutive_notes(12)
     note_names = '|'.join(f'{n.name+"|"+n.alt_name if n.alt_name else n.name:^9}' for n in note_list)
-    frequencies = '|'.join(f'{n.frequency:^9}' for n in note_list)
+    frequencies = '|'.join(f'{n.frequency:^9.2f}' for n in note_list)
     lines = '+'.join(f'{"---------":9}' for i in note_list)
     print(
     f'\nOctave : {octave}',
@@ -404,28 +805,203 @@ def get_chord_list_from_progression(key, progression, octave, random_type=False)
     octave -- octave of the first degree note chord (starting octave)
     random_type -- whether to randomly choose a chord type from the possibe chord types at each degree
     """
-    chord_list = []
-    type_list = []
-    octave_list = []
-    base_scale_name = key
+    batch = resolve_progressions([(key, progression)], octave, random_type)
+    return batch.progression(0)
+
+@lru_cache(maxsize=None)
+def get_key_harmonization(key, octave):
+    """Returns the harmonization table of a key as a tuple of numpy arrays (root_midi_ids, chord_type_ids, chord_counts)
+       root_midi_ids[d] -- midi id of the root of degree d+1
+       chord_type_ids[d, :chord_counts[d]] -- indexes (in all_chord_info order) of the chord types possible at degree d+1
+       Built once per key and octave.
+
+    Arguments:
+    key -- Key (C, Dm ..etc)
+    octave -- octave of the first degree
+    """
+    import numpy
     if 'm' in key:
         base_scale_name = 'Minor'
         key = re.sub('m', '', key)
     else:
         base_scale_name = 'Major'
+    tensor, scale_names, chord_names = get_chord_compatibility_tensor()
+    degree_count = len(scale_steps[base_scale_name])
+    rows = tensor[scale_names.index(base_scale_name), :degree_count]
+    chord_counts = rows.sum(axis=1)
+    chord_type_ids = numpy.zeros((degree_count, max(chord_counts.max(), 1)), dtype=numpy.int16)
+    for d, row in enumerate(rows):
+        chord_type_ids[d, :chord_counts[d]] = numpy.flatnonzero(row)
+    base_scale = catalog.scale(key, base_scale_name, 'Ionian', octave)
+    root_midi_ids = numpy.array([n.midi_id for n in base_scale[:degree_count]], dtype=numpy.int8)
+    for a in (root_midi_ids, chord_type_ids, chord_counts):
+        a.setflags(write=False)
+    return root_midi_ids, chord_type_ids, chord_counts
+
+class ProgressionBatch:
+    """Columnar result of resolve_progressions.
+       Chords of all progressions are stored back to back in numpy arrays.
+       The chords of progression i are at indexes offsets[i]:offsets[i+1].
+    """
+
+    __slots__ = ('offsets', 'roots', 'chord_types', 'octaves')
 
-    chord_matrix = get_possible_chord_matrix(base_scale_name)
-    base_scale = construct_scale(root_name=key, scale_name=base_scale_name, mode_name='Ionian', octave=octave)
-    for degree in progression:
-        degree = int(degree)
-        # skip degrees that has no possible chords
-        if not chord_matrix[degree-1]:
-            continue
-        chord_type = chord_matrix[degree-1][0] if not random_type else random.choice(chord_matrix[degree-1])
-        chord_list.append(base_scale[degree-1].name)
-        octave_list.append(base_scale[degree-1].octave)
-        type_list.append(chord_type)
-    return chord_list, type_list, octave_list
+    def __init__(self, offsets, roots, chord_types, octaves):
+        """Arguments:
+        offsets -- int array of length progression count + 1
+        roots -- int8 array of root chromatic positions (0: C ~ 11: B)
+        chord_types -- int16 array of chord type indexes in all_chord_info order (see chord_type_names)
+        octaves -- int8 array of root octaves
+        """
+        self.offsets = offsets
+        self.roots = roots
+        self.chord_types = chord_types
+        self.octaves = octaves
+
+    @property
+    def chord_type_names(self):
+        return list(all_chord_info)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def progression(self, i):
+        """Returns progression i as (chord_list, type_list, octave_list), same as get_chord_list_from_progression"""
+        chord_names = self.chord_type_names
+        section = slice(self.offsets[i], self.offsets[i+1])
+        return ([note_names[r] for r in self.roots[section].tolist()],
+                [chord_names[t] for t in self.chord_types[section].tolist()],
+                self.octaves[section].tolist())
+
+def resolve_progressions(progressions, octave=4, random_type=False, seed=None):
+    """Resolves many chord progressions at once against cached per key harmonization tables
+       Degrees that have no possible chords are skipped.
+
+    Arguments:
+    progressions -- iterable of (key, progression) pairs. Ex.: [('C', [1, 4, 1, 5]), ('Am', [1, 6, 7])]
+    octave -- octave of the first degree note chord (starting octave)
+    random_type -- whether to randomly choose a chord type from the possibe chord types at each degree
+    seed -- seed of the random generator used when random_type is True. Same seed gives the same chord types
+    """
+    import numpy
+    keys = {}
+    key_ids = []
+    lengths = []
+    degrees = []
+    for key, progression in progressions:
+        key_ids.append(keys.setdefault(key, len(keys)))
+        lengths.append(len(progression))
+        degrees.extend(progression)
+    # Stack the harmonization tables of all keys in the batch
+    tables = [get_key_harmonization(key, octave) for key in keys]
+    if not tables:
+        empty = numpy.zeros(0, dtype=numpy.int8)
+        return ProgressionBatch(numpy.zeros(1, dtype=numpy.int64), empty, empty.astype(numpy.int16), empty)
+    degree_count = len(tables[0][0])
+    max_count = max(t[1].shape[1] for t in tables)
+    root_table = numpy.stack([t[0] for t in tables])
+    count_table = numpy.stack([t[2] for t in tables])
+    type_table = numpy.zeros((len(tables), degree_count, max_count), dtype=numpy.int16)
+    for k, t in enumerate(tables):
+        type_table[k, :, :t[1].shape[1]] = t[1]
+
+    # One row per chord of every progression
+    slot_progression = numpy.repeat(numpy.arange(len(lengths)), lengths)
+    slot_key = numpy.asarray(key_ids, dtype=numpy.intp)[slot_progression]
+    slot_degree = numpy.asarray(degrees, dtype=numpy.intp) - 1
+    if slot_degree.size and (slot_degree.min() < 0 or slot_degree.max() >= degree_count):
+        raise ValueError("Invalid degree")
+    counts = count_table[slot_key, slot_degree]
+    # skip degrees that has no possible chords
+    valid = counts > 0
+    slot_progression, slot_key, slot_degree, counts = slot_progression[valid], slot_key[valid], slot_degree[valid], counts[valid]
+    if random_type:
+        rng = numpy.random.default_rng(seed)
+        choice = (rng.random(len(counts)) * counts).astype(numpy.intp)
+    else:
+        choice = numpy.zeros(len(counts), dtype=numpy.intp)
+    root_midi_ids = root_table[slot_key, slot_degree]
+    offsets = numpy.zeros(len(lengths) + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(slot_progression, minlength=len(lengths)), out=offsets[1:])
+    return ProgressionBatch(offsets, (root_midi_ids % 12).astype(numpy.int8),
+                            type_table[slot_key, slot_degree, choice], (root_midi_ids // 12 - 1).astype(numpy.int8))
+
+## Voice leading
+@lru_cache(maxsize=4096)
+def get_voicing_candidates(root_name, chord_name, low, high):
+    """Returns every close position voicing (all inversions at all octaves) of a chord that fits in a midi id range
+       as an int array of shape (voicings, notes). Notes of each voicing are sorted from low to high.
+
+    Arguments:
+    root_name -- name of root note
+    chord_name -- name of the chord
+    low, high -- lowest and highest allowed midi ids
+    """
+    import numpy
+    offsets = chord_offsets[chord_name]
+    root_pos = Note(root_name, 4).midi_id % 12
+    candidates = set()
+    for inversion in range(len(offsets)):
+        # Move the notes below the bass an octave up
+        inverted = offsets[inversion:] + [o + 12 for o in offsets[:inversion]]
+        for root_midi_id in range(root_pos, MAX_MIDI_ID + 1, 12):
+            voicing = tuple(sorted(root_midi_id + o for o in inverted))
+            if len(set(voicing)) < len(voicing):
+                # skip voicings doubling a note at the same pitch (ex.: Power chord octave note)
+                continue
+            if voicing[0] >= max(low, MIN_MIDI_ID) and voicing[-1] <= min(high, MAX_MIDI_ID):
+                candidates.add(voicing)
+    return numpy.array(sorted(candidates), dtype=numpy.int16).reshape(len(candidates), len(offsets))
+
+def voice_movement(voicings_a, voicings_b):
+    """Returns a matrix of the total voice movement (in half steps) from every voicing of voicings_a to every voicing of voicings_b
+       Voicings of the same size move voice by voice. Otherwise, each note moves to the nearest note of the other voicing.
+
+    Arguments:
+    voicings_a, voicings_b -- int arrays of shape (voicings, notes) with sorted notes
+    """
+    import numpy
+    distances = numpy.abs(voicings_a[:, None, :, None] - voicings_b[None, :, None, :])
+    if voicings_a.shape[1] == voicings_b.shape[1]:
+        return distances.diagonal(axis1=2, axis2=3).sum(axis=-1)
+    return (distances.min(axis=3).sum(axis=-1) + distances.min(axis=2).sum(axis=-1)) / 2
+
+def voice_lead_progression(chords, voice_range=(48, 84)):
+    """Returns the voicings of a chord progression that minimize the total voice movement, as a list of NoteArray.
+       Solved by dynamic programming over the voicing candidates of each chord.
+       The first chord stays as close as possible to its root position voicing at the requested octave.
+
+    Arguments:
+    chords -- list of (root_name, chord_name, octave) tuples. Ex.: zip(*get_chord_list_from_progression(..))
+    voice_range -- (lowest, highest) midi ids allowed in the voicings
+    """
+    import numpy
+    chords = list(chords)
+    if not chords:
+        return []
+    low, high = voice_range
+    candidates = []
+    for root_name, chord_name, octave in chords:
+        voicings = get_voicing_candidates(note_alt_name_converter(root_name), chord_name, low, high)
+        if not len(voicings):
+            # Nothing fits in the range. Keep the root position voicing
+            voicings = numpy.array([sorted(n.midi_id for n in construct_chord(root_name, chord_name, octave))], dtype=numpy.int16)
+        candidates.append(voicings)
+    root_position = numpy.array([sorted(n.midi_id for n in construct_chord(*chords[0]))], dtype=numpy.int16)
+    cost = voice_movement(root_position, candidates[0])[0]
+    back_pointers = []
+    for previous, current in zip(candidates, candidates[1:]):
+        total = cost[:, None] + voice_movement(previous, current)
+        back_pointers.append(total.argmin(axis=0))
+        cost = total.min(axis=0)
+    # Walk back from the cheapest last voicing
+    choice = int(cost.argmin())
+    path = [choice]
+    for pointers in reversed(back_pointers):
+        choice = int(pointers[choice])
+        path.append(choice)
+    path.reverse()
+    return [NoteArray(voicings[i]) for voicings, i in zip(candidates, path)]
 
 def note_alt_name_appender(note_name):
     """Returns a string of note_name and its alternative name if one exists
@@ -443,12 +1019,7 @@ def note_alt_name_converter(note_name):
     """Returns the note_name key in basic_notes, if a note is passed using the alt_name notation
     Ex.: Eb returns D#
     """
-    if 'b' in note_name:
-        for basic_name, note_info in basic_notes.items():
-            if note_info['alt_name'] == note_name:
-                note_name = basic_name
-                break
-    return note_name
+    return note_name_lookup.get(note_name, note_name)
 
 if __name__ == '__main__':
     print(header)
@@ -1,11 +1,27 @@
+from os import environ
 import mt_toolbox as mt
 from basic_parser import basic_parser
 import playback as pb
-import pygame.time
-import threading
+import itertools
+from midi_session import MidiSession
 VIEW = None
 GRAPHICAL = False
 SAVE_PNG = False
+ANIMATION_FORMAT = None # 'gif' or 'png' (frames) to export animations instead of showing them
+VOICE_LEADING = False
+PLAYBACK_TASK = None # Background playback of the graphical mode
+graphical_chord_ms = 1200 # Length of the chords played in the graphical mode
+MIDI_SESSION = None # MidiSession collecting the played items when exporting to a MIDI file
+TUNING = ('12-TET', mt.A4_FREQUENCY) # Tuning system and A4 pitch. Non 12-TET tunings are rebuilt on the tonic of what is played
+
+def set_tonic(tonic):
+    """Builds the active tuning on tonic, so that just and pythagorean intervals are pure relative to the played root or key
+
+    Arguments:
+    tonic -- name of the root note of the scale or chord, or of the key of a progression
+    """
+    mt.set_tuning(*TUNING, tonic=tonic)
+
 def scale_command_processor(root_name, scale_name, octave, mode_name, ms = 200):
     """Plays single or multiple scales depending on the input
 
@@ -28,9 +44,11 @@ def scale_command_processor(root_name, scale_name, octave, mode_name, ms = 200):
         # Play specific scale at all roots
         if GRAPHICAL:
             for root_name in mt.basic_notes.keys():
+                set_tonic(root_name)
                 graphical_construct_and_play_scale(root_name, scale_name, mode_name, octave, single_run=False)
         else:
             for root_name in mt.basic_notes.keys():
+                set_tonic(root_name)
                 construct_and_play_scale(root_name, scale_name, mode_name, octave, single_run=False)
     if scale_name =='all':
         # Play all scales for a specific root
@@ -47,9 +65,11 @@ def scale_command_processor(root_name, scale_name, octave, mode_name, ms = 200):
             raise ValueError("Error: Modes not supported for non-heptatonic scales")
         if GRAPHICAL:
             for m, n in zip(mt.mode_info, base_scale_notes):
+                set_tonic(n.name)
                 graphical_construct_and_play_scale(n.name, scale_name, m, octave, single_run=False)
         else:
             for m, n in zip(mt.mode_info, base_scale_notes):
+                set_tonic(n.name)
                 construct_and_play_scale(n.name, scale_name, m, octave, single_run=False)
     ## Deprecate this case
     #else:
@@ -59,66 +79,96 @@ def scale_command_processor(root_name, scale_name, octave, mode_name, ms = 200):
     #        for root_name in basic_notes.keys():
     #            construct_and_play_scale(root_name, scale_name, mode_name, octave, single_run=False)
 
-def construct_and_play_chord(root_name, chord_name, octave, single_run=True):
+def construct_and_play_chord(root_name, chord_name, octave, single_run=True, voicing=None):
     chord_notes = mt.construct_chord(root_name, chord_name, octave)
     mt.print_chord(root_name, chord_name, chord_notes)
-    pb.play_chord(chord_notes)
+    if MIDI_SESSION is not None:
+        MIDI_SESSION.add('chords', f'{root_name} {chord_name}', voicing if voicing is not None else chord_notes, 'arp' if pb.ARPEGGIATE else 'chord')
+        return
+    pb.play_chord(voicing.to_notes() if voicing is not None else chord_notes, name=f'{root_name}_{chord_name}_chord')
     if not single_run:
-        pygame.time.delay(200)
+        pb.pause(200)
 def construct_and_play_scale(root_name, scale_name, mode_name, octave, single_run=True):
         # logic
         scale_notes = mt.construct_scale(root_name, scale_name, mode_name, octave)
         # view
         mt.print_scale(root_name, scale_name, scale_notes, mode_name)
         # playback
-        pb.play_scale(scale_notes, ms=300)
+        if MIDI_SESSION is not None:
+            MIDI_SESSION.add('scales', f'{root_name} {scale_name}' + (f' ({mode_name})' if mode_name != 'Ionian' else ''), scale_notes)
+            return
+        pb.play_scale(scale_notes, ms=300, name=f'{root_name}_{mode_name}_{scale_name}_scale')
         if not single_run:
-            pygame.time.delay(200)
+            pb.pause(200)
 
 def graphical_construct_and_play_scale(root_name, scale_name, mode_name, octave, single_run=True):
         # logic
-        scale_notes = mt.construct_scale(root_name, scale_name, mode_name, octave)
+        scale_notes = mt.construct_scale_array(root_name, scale_name, mode_name, octave)
         animation_frame_interval = (VIEW.animation_frame_interval)/1000 # to seconds from milliseconds
         # playback
         ## Play notes only if non save png mode
         if not SAVE_PNG:
-            pb.create_midi(scale_notes, 'scale', t = animation_frame_interval)
-            thread = threading.Thread(target=pb.play_midi_file, args=(pb.midi_filename,))
-            thread.start()
+            # One note per animation frame
+            start_background_playback(pb.piece_segments(scale_notes, VIEW.animation_frame_interval), f'{root_name}_{mode_name}_{scale_name}_scale')
         # view
         if mode_name != 'Ionian':
             object_name_label = f'{root_name} {mode_name} of\n{scale_name}\nscale'
         else:
             object_name_label = f'{root_name}\n{scale_name}\nscale'
         VIEW.setup_parameters(scale_notes, root_name, object_name_label)
-        if SAVE_PNG:
+        if ANIMATION_FORMAT:
+            VIEW.export_animation(f'{root_name}_{mode_name}_{scale_name}_scale.{ANIMATION_FORMAT}', ANIMATION_FORMAT)
+        elif SAVE_PNG:
             img_name = f'{root_name}_{mode_name}_{scale_name}_scale.png'
             VIEW.save_plot_image(img_name)
         else:
             VIEW.animate_plot(pause_length=animation_frame_interval*len(scale_notes)+1, single_run=single_run)
 
-def graphical_construct_and_play_chord(root_name, chord_name, octave, arp=True, single_run=True):
+def graphical_construct_and_play_chord(root_name, chord_name, octave, arp=True, single_run=True, voicing=None):
         # logic
-        chord_notes = mt.construct_chord(root_name, chord_name, octave)
+        chord_notes = mt.construct_chord_array(root_name, chord_name, octave)
+        played_notes = voicing if voicing is not None else chord_notes
         animation_frame_interval = (VIEW.animation_frame_interval)/1000 # to seconds from milliseconds
         # playback
         ## play notes only if non save png mode
         if not SAVE_PNG:
             if arp:
-                pb.create_arp_chord_midi(chord_notes, t = animation_frame_interval)
+                # One note per animation frame, then the whole chord
+                segments = [*pb.piece_segments(played_notes, VIEW.animation_frame_interval), ([], VIEW.animation_frame_interval), (played_notes, graphical_chord_ms)]
             else:
-                pb.create_midi(chord_notes, 'c')
-            thread = threading.Thread(target=pb.play_midi_file, args=(pb.midi_filename,))
-            thread.start()
+                segments = [(played_notes, graphical_chord_ms)]
+            start_background_playback(segments, f'{root_name}_{chord_name}_chord')
         # view
         object_name_label = f'{root_name}\n{chord_name}\nchord'
         VIEW.setup_parameters(chord_notes, root_name, object_name_label)
-        if SAVE_PNG:
+        if ANIMATION_FORMAT:
+            VIEW.export_animation(f'{root_name}_{chord_name}_chord.{ANIMATION_FORMAT}', ANIMATION_FORMAT)
+        elif SAVE_PNG:
             img_name = f'{root_name}_{chord_name}_chord.png'
             VIEW.save_plot_image(img_name)
         else:
             VIEW.animate_plot(pause_length=animation_frame_interval+1 if not arp else (animation_frame_interval*len(chord_notes)+1)+1, single_run=single_run)
 
+def start_background_playback(segments, name=None):
+    """Plays a timeline with the audio backend in use without blocking the animation.
+       Stops the previous background playback, if any
+
+    Arguments:
+    segments -- iterable of (notes, ms) pairs
+    name -- name of the timeline, used by backends that save what they play
+    """
+    import async_playback as ap
+    global PLAYBACK_TASK
+    if PLAYBACK_TASK is not None:
+        PLAYBACK_TASK.cancel()
+    PLAYBACK_TASK = ap.start(ap.play(segments, name))
+    PLAYBACK_TASK.add_done_callback(report_playback_error)
+
+def report_playback_error(task):
+    """Prints the error of a finished background playback, which would otherwise go unnoticed"""
+    if not task.cancelled() and task.exception() is not None:
+        print(f'Error: Background playback failed: {task.exception()}')
+
 def progression_command_processor(key, progression, octave):
     """Plays a chord progression
 
@@ -128,35 +178,57 @@ def progression_command_processor(key, progression, octave):
     octave -- octave
     """
     chord_list, type_list, octave_list = mt.get_chord_list_from_progression(key, progression, octave)
-    if GRAPHICAL:
-        for r, t, o in zip(chord_list, type_list, octave_list):
-            graphical_construct_and_play_chord(root_name=r, chord_name=t, octave=o, arp=False, single_run=False)
+    if VOICE_LEADING:
+        # Lowest voice starts an octave below the progression octave
+        voicings = mt.voice_lead_progression(zip(chord_list, type_list, octave_list), voice_range=(12 * octave, 12 * (octave + 3)))
+    else:
+        voicings = [None] * len(chord_list)
+    if MIDI_SESSION is not None:
+        for r, t, o, v in zip(chord_list, type_list, octave_list, voicings):
+            chord_notes = mt.construct_chord(r, t, o)
+            mt.print_chord(r, t, chord_notes)
+            MIDI_SESSION.add('progression', f'{r} {t}', v if v is not None else chord_notes, 'chord')
+    elif isinstance(pb.get_backend(), pb.WavFileBackend):
+        # Render the whole progression to a single file
+        pb.ARPEGGIATE = False
+        segments = []
+        for r, t, o, v in zip(chord_list, type_list, octave_list, voicings):
+            chord_notes = mt.construct_chord(r, t, o)
+            mt.print_chord(r, t, chord_notes)
+            segments.append(pb.chord_segments(v.to_notes() if v is not None else chord_notes))
+        pb.get_backend().play(itertools.chain.from_iterable(segments), f'{key}_progression_{"-".join(map(str, progression))}')
+    elif GRAPHICAL:
+        for r, t, o, v in zip(chord_list, type_list, octave_list, voicings):
+            graphical_construct_and_play_chord(root_name=r, chord_name=t, octave=o, arp=False, single_run=False, voicing=v)
     else:
-        for r, t, o in zip(chord_list, type_list, octave_list):
-            chord_command_processor(root_name=r, chord_name=t, octave=o, arp=False)
+        for r, t, o, v in zip(chord_list, type_list, octave_list, voicings):
+            chord_command_processor(root_name=r, chord_name=t, octave=o, arp=False, voicing=v)
 
-def chord_command_processor(root_name, chord_name, octave, arp=True):
+def chord_command_processor(root_name, chord_name, octave, arp=True, voicing=None):
     """Plays a single or multiple chords depending on input
 
     Arguments:
     root_name -- name of the root note (C, D ..etc or 'all')
     chord_name -- name of the chord to play. 'all' to play all chords
     octave -- octave at which to play the chord
+    voicing -- NoteArray of the notes to play instead of the root position chord (single chords only)
     """
     print(f'\nPlaying [{chord_name}] chord(s) with [{root_name}] as root note(s)')
     pb.ARPEGGIATE = arp
     if 'all' not in (root_name, chord_name):
         if GRAPHICAL:
-            graphical_construct_and_play_chord(root_name, chord_name, octave, arp=True, single_run=True)
+            graphical_construct_and_play_chord(root_name, chord_name, octave, arp=True, single_run=True, voicing=voicing)
         else:
-            construct_and_play_chord(root_name, chord_name, octave)
+            construct_and_play_chord(root_name, chord_name, octave, voicing=voicing)
     if root_name == 'all':
         # Play specific chord at all roots
         if GRAPHICAL:
             for root_name in mt.basic_notes.keys():
+                set_tonic(root_name)
                 graphical_construct_and_play_chord(root_name, chord_name, octave, arp=True, single_run=False)
         else:
             for root_name in mt.basic_notes.keys():
+                set_tonic(root_name)
                 construct_and_play_chord(root_name, chord_name, octave, single_run=False)
     if chord_name == 'all':
         # Play all chords for a specific root
@@ -182,8 +254,11 @@ def note_processor(note_name, octave):
     octave -- octave at which to play the note
     """
     note = mt.Note(note_name, octave)
-    print(f'\n|_Playing {mt.note_alt_name_appender(note.name)} note in octave {note.octave} | Frequency: {note.frequency} Hz\n')
-    pb.play_note(note, 700)
+    print(f'\n|_Playing {mt.note_alt_name_appender(note.name)} note in octave {note.octave} | Frequency: {note.frequency:.2f} Hz\n')
+    if MIDI_SESSION is not None:
+        MIDI_SESSION.add('notes', f'{note.name}{note.octave}', [note])
+        return
+    pb.play_note(note, 700, name=f'{note.name}{note.octave}_note')
 
 def command_processor(args, parser):
     """Main command processor
@@ -191,22 +266,50 @@ def command_processor(args, parser):
     Arguments:
     args -- flags and input passed to the script
     """
-    global VIEW, GRAPHICAL, SAVE_PNG
+    global VIEW, GRAPHICAL, SAVE_PNG, ANIMATION_FORMAT, VOICE_LEADING, MIDI_SESSION, TUNING
     print(mt.header)
     if(args['keyboard']):
         print(mt.piano_keys)
+    if args['batch_export']:
+        batch_export_processor(args, parser)
+        return
     all_count = sum(1 for var in (args['scale'], args['chord'], args['root'], args['mode']) if var == 'all')
     if all_count > 1:
-        parser.error("Error: Can't specify 'all' for more than one option")
+        parser.error("Error: Can't specify 'all' for more than one option (use --batch-export to export combinations)")
+    if args['export_animation'] and not args['graphics']:
+        parser.error("**--export-animation is only supported in the graphical mode**")
+    if args['render_wav']:
+        if args['graphics']:
+            parser.error("**--render-wav is not supported in the graphical mode**")
+        pb.set_backend('wav', directory=args['render_wav'])
+    if args['export_midi']:
+        if args['graphics'] or args['render_wav']:
+            parser.error("**--export-midi is not supported with --render-wav or in the graphical mode**")
+        MIDI_SESSION = MidiSession(tempo=args['tempo'], instrument=args['instrument'])
     if args['graphics']:
         import chord_visualizer
         VIEW = chord_visualizer
         GRAPHICAL = True
         VIEW.ANIMATE =args['animate']
         SAVE_PNG = args['output']
-        pb.MIDI = True
+        ANIMATION_FORMAT = args['export_animation']
+        if ANIMATION_FORMAT:
+            # Headless export: no window and no playback
+            import matplotlib
+            matplotlib.use('Agg')
+            SAVE_PNG = True
+    if args['audio_backend']:
+        pb.set_backend(args['audio_backend'])
     if(args['midi']):
-        pb.MIDI = True
+        pb.set_backend('midi')
+    if GRAPHICAL and not SAVE_PNG and pb.backend is None and 'MT_AUDIO_BACKEND' not in environ:
+        # The graphical mode plays MIDI unless another backend is chosen
+        pb.set_backend('midi')
+    TUNING = (args['tuning'], args['a4'])
+    # Tonic of the tuning: key of the progression, else the played note or root ('all' roots retune one by one)
+    tonic = args['key'].rstrip('m') if args['progression'] else args['note'] or args['root']
+    set_tonic(tonic if tonic != 'all' else 'C')
+    VOICE_LEADING = args['voice_leading']
     if args['mode'] != list(mt.mode_info)[0] and not args['scale']:
         parser.error("**Modes other than the default Ionian are only supported for scale commands**")
     if args['scale']:
@@ -222,6 +325,29 @@ def command_processor(args, parser):
         progression_command_processor(args['key'], args['progression'], args['octave'])
     elif args['tutorial']:
         import sensei_mode
+    if MIDI_SESSION is not None and MIDI_SESSION.item_count:
+        MIDI_SESSION.write(args['export_midi'])
+        print(f'Saved {args["export_midi"]} ({MIDI_SESSION.item_count} items)')
+
+def batch_export_processor(args, parser):
+    """Exports the scales or chords selected by the root, scale, chord and mode options in parallel.
+       Any of these options can be 'all', to export their whole cartesian product.
+
+    Arguments:
+    args -- flags and input passed to the script
+    """
+    import batch_export
+    if not (args['scale'] or args['chord']):
+        parser.error("**--batch-export is only supported for scale and chord commands**")
+    if args['mode'] != list(mt.mode_info)[0] and not args['scale']:
+        parser.error("**Modes other than the default Ionian are only supported for scale commands**")
+    select = lambda value, choices: list(choices) if value == 'all' else [value] if value else None
+    results = batch_export.export_batch(args['batch_export'], args['batch_formats'], tuning=args['tuning'], a4=args['a4'],
+                                        packs=args['pack'] or [], progress=batch_export.print_progress,
+                                        roots=select(args['root'], mt.basic_notes), scales=select(args['scale'], mt.all_scale_info),
+                                        modes=select(args['mode'], mt.mode_info), chords=select(args['chord'], mt.all_chord_info),
+                                        octave=args['octave'])
+    print(f"Exported {sum(1 for r in results if r[2] is None)} of {len(results)} items to {args['batch_export']}")
 
 def list_supported_values():
     """Lists available values for the different options"""
@@ -248,10 +374,21 @@ def parse_arguments(parser, group):
     parser.add_argument('-o','--octave', choices=[i for i in range(0, 9)], help='Octave settings. Octave 4 is where A = 440Hz', default = 4, type = int, metavar = '')
     parser.add_argument('-b','--keyboard', help='Show a reference piano keyboard', action ='store_true')
     parser.add_argument('-d','--midi', help='Use the midiutil instead to play notes', action ='store_true')
+    parser.add_argument('--tuning', choices=list(mt.tuning_systems), help='Tuning system used to compute note frequencies', default = '12-TET', metavar = '')
+    parser.add_argument('--a4', help='Reference pitch of A4 in Hz', default = mt.A4_FREQUENCY, type = float, metavar = '')
+    parser.add_argument('--voice-leading', help='Play progression chords in the inversions and octaves that minimize voice movement', action ='store_true')
+    parser.add_argument('--audio-backend', choices=['pygame', 'midi', 'null'], help='Audio backend used to play sounds. Defaults to the MT_AUDIO_BACKEND environment variable, or pygame', metavar = '')
+    parser.add_argument('--render-wav', help='Render sounds to WAV files in this directory instead of playing them', metavar = 'DIR')
+    parser.add_argument('--export-midi', help='Write all played items to this single multi-track MIDI file instead of playing them', metavar = 'FILE')
+    parser.add_argument('--tempo', help='Tempo in BPM of the exported MIDI file', default = pb.tempo, type = int, metavar = '')
+    parser.add_argument('--instrument', choices=range(0, 128), help='General MIDI program number (0~127) of the exported MIDI file', default = pb.instrument, type = int, metavar = '')
+    parser.add_argument('--batch-export', help="Export the selected scales or chords to this directory in parallel. Allows 'all' for several options", metavar = 'DIR')
+    parser.add_argument('--batch-formats', nargs='+', choices=['png', 'wav', 'gif', 'frames'], help='Formats of --batch-export', default = ['png', 'wav'], metavar = '')
     parser.add_argument('-k','--key', choices=key_choices ,help='Key name. Example C(C major) or Am(A minor)', default = 'C', metavar = '')
     # options unique to the graphical backend
     parser.add_argument('-g','--graphics', help='To use the matplotlib as the graphics backend instead of console print out', action ='store_true')
     parser.add_argument('-v','--output', help='Save as png image', action ='store_true')
+    parser.add_argument('--export-animation', choices=['gif', 'png'], help='Export the full animation as a GIF or numbered PNG frames instead of showing it', metavar = '')
     parser.add_argument('-a','--animate', help='animate notes to show them one by one', action ='store_true')
 
     args = vars(parser.parse_args())
@@ -1,4 +1,7 @@
+# numpy is only imported by NoteArray, so that printing single notes, scales and chords starts fast
+
 # Octave 4
+# frequency values are rounded 12-TET references. Exact pitches come from the frequency table below
 basic_notes = {
     "C"  : {"alt_name" : "",   "frequency" : 261.63, "midi_id" : 60},
     "C#" : {"alt_name" : "Db", "frequency" : 277.18, "midi_id" : 61},
@@ -17,45 +20,139 @@ basic_notes = {
 MAX_OCTAVE = 8
 MIN_OCTAVE = 0
 
+# Chromatic note names in basic_notes order (C, C#, D ..etc)
+NOTE_NAMES = list(basic_notes.keys())
+# Maps both the # and the b notation of a note name to its basic_notes key
+note_name_lookup = {}
+for _note_name, _note_info in basic_notes.items():
+    note_name_lookup[_note_name] = _note_name
+    if _note_info['alt_name']:
+        note_name_lookup[_note_info['alt_name']] = _note_name
+# Midi id range covered by the supported octaves (C0 ~ B8)
+MIN_MIDI_ID = basic_notes['C']['midi_id'] + 12 * (MIN_OCTAVE - 4)
+MAX_MIDI_ID = basic_notes['B']['midi_id'] + 12 * (MAX_OCTAVE - 4)
+
+## Tuning
+# Reference pitch of A4 in Hz
+A4_FREQUENCY = 440.0
+# Frequency ratios of the 12 chromatic steps above the tonic for each tuning system
+tuning_systems = {
+    "12-TET"      : tuple(2 ** (i / 12) for i in range(12)),
+    "Just"        : (1, 16/15, 9/8, 6/5, 5/4, 4/3, 45/32, 3/2, 8/5, 5/3, 9/5, 15/8),
+    "Pythagorean" : (1, 256/243, 9/8, 32/27, 81/64, 4/3, 729/512, 3/2, 128/81, 27/16, 16/9, 243/128),
+}
+# Frequency table cache. One table per (tuning, a4, tonic) combination
+_frequency_tables = {}
+
+def build_frequency_table(tuning='12-TET', a4=A4_FREQUENCY, tonic='C'):
+    """Returns a tuple of note frequencies indexed by midi_id - MIN_MIDI_ID
+       The table is built once per combination of arguments and cached.
+       Non equal temperaments are built relative to the tonic, and tuned so that A4 is always a4 Hz.
+
+    Arguments:
+    tuning -- name of the tuning system as defined in the tuning_systems dict
+    a4 -- reference pitch of A4 in Hz
+    tonic -- name of the note the tuning ratios are relative to (only affects non 12-TET tunings)
+    """
+    key = (tuning, float(a4), note_name_lookup[tonic])
+    if key not in _frequency_tables:
+        ratios = tuning_systems[tuning]
+        tonic_midi_id = basic_notes[key[2]]['midi_id']
+        # Ratio of every note to the tonic at octave 4
+        tonic_ratios = [ratios[step % 12] * 2.0 ** (step // 12) for step in range(MIN_MIDI_ID - tonic_midi_id, MAX_MIDI_ID + 1 - tonic_midi_id)]
+        # Scale so that A4 lands exactly on a4
+        a4_ratio = tonic_ratios[basic_notes['A']['midi_id'] - MIN_MIDI_ID]
+        _frequency_tables[key] = tuple(a4 * ratio / a4_ratio for ratio in tonic_ratios)
+    return _frequency_tables[key]
+
+def set_tuning(tuning='12-TET', a4=A4_FREQUENCY, tonic='C'):
+    """Selects the frequency table used by Note.frequency
+
+    Arguments:
+    tuning -- name of the tuning system as defined in the tuning_systems dict
+    a4 -- reference pitch of A4 in Hz
+    tonic -- name of the note the tuning ratios are relative to (only affects non 12-TET tunings)
+    """
+    global frequency_table
+    if tuning not in tuning_systems:
+        raise ValueError("Invalid tuning system")
+    if tonic not in note_name_lookup:
+        raise ValueError("Invalid note name")
+    frequency_table = build_frequency_table(tuning, a4, tonic)
+
 class Note:
+    """A musical note at a specific octave.
+       Notes are immutable and interned: Note('C', 4) always returns the same object,
+       taken from a table of all notes between MIN_OCTAVE and MAX_OCTAVE built once at import.
+    """
+
+    __slots__ = ('_name', '_alt_name', '_octave', '_midi_id')
 
-    def __init__(self, name, octave):
+    def __new__(cls, name, octave):
         #Ensure first character of name is in upper case
         name = name[0].upper() + name[1:]
-        self.name = name
-        self.octave = octave
-        self._midi_id = self.get_midi_id()
-        octave_multiplier = self.octave_converter()
-        self._frequency = basic_notes[self.name]['frequency'] * octave_multiplier
+        basic_name = note_name_lookup.get(name)
+        if basic_name is None:
+            raise ValueError("Invalid note name")
+        if octave not in range(MIN_OCTAVE, MAX_OCTAVE+1):
+            raise ValueError("Invalid octave value")
+        return _note_table[basic_notes[basic_name]['midi_id'] + 12 * (octave - 4) - MIN_MIDI_ID]
+
+    @classmethod
+    def from_midi(cls, midi_id):
+        """Returns the Note object of a midi id
+
+        Arguments:
+        midi_id -- (int) midi id of the note (MIN_MIDI_ID ~ MAX_MIDI_ID)
+        """
+        if not MIN_MIDI_ID <= midi_id <= MAX_MIDI_ID:
+            raise ValueError("Invalid octave value")
+        return _note_table[midi_id - MIN_MIDI_ID]
+
+    @classmethod
+    def _create(cls, name, octave):
+        """Builds a new Note object. Only used to populate the note table"""
+        note = object.__new__(cls)
+        note._name = name
+        note._alt_name = basic_notes[name]['alt_name']
+        note._octave = octave
+        note._midi_id = note.get_midi_id()
+        return note
 
     def __eq__(self, other):
         if not isinstance(other, Note):
             # don't attempt to compare against unrelated types
             return NotImplemented
 
-        return self.name == other.name and self.octave == other.octave
+        return self._midi_id == other._midi_id
+
+    def __hash__(self):
+        return self._midi_id
+
+    def __repr__(self):
+        return f'Note({self._name!r}, {self._octave})'
+
+    def __reduce__(self):
+        # Unpickle to the interned instance
+        return (Note.from_midi, (self._midi_id,))
 
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     @property
     def name(self):
         return self._name
 
-    @name.setter
-    def name(self, value):
-        for note_name, note_info in basic_notes.items():
-            if value == note_name or value == note_info['alt_name']:
-                self._name = note_name
-                self._alt_name = note_info['alt_name']
-                return
-        raise ValueError("Invalid note name")
-
     @property
     def alt_name(self):
         return self._alt_name
 
     @property
     def frequency(self):
-        return self._frequency
+        return float(frequency_table[self._midi_id - MIN_MIDI_ID])
 
     @property
     def octave(self):
@@ -65,15 +162,6 @@ class Note:
     def midi_id(self):
         return self._midi_id
 
-    @octave.setter
-    def octave(self, value):
-        if value not in range(MIN_OCTAVE, MAX_OCTAVE+1):
-            raise ValueError("Invalid octave value")
-        self._octave = value
-        self._midi_id = self.get_midi_id()
-        octave_multiplier = self.octave_converter()
-        self._frequency = basic_notes[self.name]['frequency'] * octave_multiplier
-
     def octave_converter(self):
         """Converts an octave to a frequency multiplier.
         Octave 4 translates to x1 multiplier since our basic_notes list is based on the 4th octave.
@@ -81,7 +169,7 @@ class Note:
         Arguments:
         self -- note object that contains the octave
         """
-        return round(2 ** (self.octave - 4), 2)
+        return 2.0 ** (self.octave - 4)
 
     def get_midi_id(self):
         """Shifts midi id by multiples of 12 depending on the octave.
@@ -95,12 +183,10 @@ class Note:
     def get_consecutive_notes(self, halfstep_count):
         """Get halfstep_count consecutive notes half step apart while updating octave as necessary"""
 
-        note = self
-        note_list = [note]
-        for i in range(1, halfstep_count):
-            note = note.get_next_step_note(1)
-            note_list.append(note)
-        return note_list
+        start = self._midi_id - MIN_MIDI_ID
+        if start + halfstep_count > len(_note_table):
+            raise ValueError("Invalid octave value")
+        return _note_table[start:start + halfstep_count]
 
     def get_next_step_note(self, halfstep_count):
         """Gets the next note that is halfstep_count above or below while updating octave as necessary
@@ -108,10 +194,104 @@ class Note:
         halfstep_count -- (int) number of half steps to increase/decrease (negative value for decrements)
         """
 
-        note_names = list(basic_notes.keys())
-        note_index = note_names.index(self.name)
-        octave = self.octave
-        note_index += halfstep_count
-        normalized_note_index = note_index%len(note_names) if note_index >= 0 else (len(note_names) - abs(note_index)%len(note_names))%len(note_names)
-        octave += int(note_index/len(note_names)) if note_index >= 0 else (int((abs(note_index)-1)/len(note_names)) + 1) * -1
-        return Note(note_names[normalized_note_index], octave)
+        return Note.from_midi(self._midi_id + halfstep_count)
+
+# Flyweight table of all supported notes, indexed by midi_id - MIN_MIDI_ID
+_note_table = [Note._create(name, octave) for octave in range(MIN_OCTAVE, MAX_OCTAVE+1) for name in NOTE_NAMES]
+# Frequency table of the active tuning, indexed by midi_id - MIN_MIDI_ID
+frequency_table = build_frequency_table()
+
+# Note names and active frequency table as numpy arrays, created on first use by NoteArray
+_numpy_tables = {}
+
+def _numpy_table(table):
+    """Returns a list or tuple table (NOTE_NAMES, frequency_table..etc) as a read-only numpy array, converted once"""
+    import numpy
+    entry = _numpy_tables.get(id(table))
+    if entry is None or entry[0] is not table:
+        entry = _numpy_tables[id(table)] = (table, numpy.array(table))
+        entry[1].setflags(write=False)
+    return entry[1]
+
+class NoteArray:
+    """A compact sequence of notes (scale, chord, melody..etc) stored as an int8 array of midi ids.
+       Attributes are computed for the whole array at once instead of note by note.
+       Iterating or indexing with an int returns the interned Note objects.
+    """
+
+    __slots__ = ('_midi_ids',)
+
+    def __init__(self, midi_ids):
+        """Arguments:
+        midi_ids -- iterable of midi ids (MIN_MIDI_ID ~ MAX_MIDI_ID)
+        """
+        import numpy
+        midi_ids = numpy.asarray(midi_ids)
+        if midi_ids.size and (midi_ids.min() < MIN_MIDI_ID or midi_ids.max() > MAX_MIDI_ID):
+            raise ValueError("Invalid octave value")
+        self._midi_ids = midi_ids.astype(numpy.int8).reshape(-1)
+        self._midi_ids.setflags(write=False)
+
+    @classmethod
+    def from_notes(cls, notes):
+        """Returns a NoteArray from a list of Note objects"""
+        import numpy
+        return cls(numpy.fromiter((n.midi_id for n in notes), dtype=numpy.int8))
+
+    def to_notes(self):
+        """Returns the notes as a list of Note objects"""
+        return [_note_table[i] for i in (self._midi_ids - MIN_MIDI_ID).tolist()]
+
+    def __len__(self):
+        return len(self._midi_ids)
+
+    def __iter__(self):
+        return iter(self.to_notes())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return NoteArray(self._midi_ids[index])
+        return _note_table[self._midi_ids[index] - MIN_MIDI_ID]
+
+    def __eq__(self, other):
+        import numpy
+        if not isinstance(other, NoteArray):
+            return NotImplemented
+        return numpy.array_equal(self._midi_ids, other._midi_ids)
+
+    def __repr__(self):
+        return f'NoteArray({self._midi_ids.tolist()})'
+
+    @property
+    def midi_ids(self):
+        return self._midi_ids
+
+    @property
+    def pitch_classes(self):
+        """Chromatic positions of the notes relative to C (0~11)"""
+        return self._midi_ids % 12
+
+    @property
+    def octaves(self):
+        return self._midi_ids // 12 - 1
+
+    @property
+    def names(self):
+        return _numpy_table(NOTE_NAMES)[self.pitch_classes]
+
+    @property
+    def frequencies(self):
+        return _numpy_table(frequency_table)[self._midi_ids - MIN_MIDI_ID]
+
+    def transpose(self, halfstep_count):
+        """Returns a new NoteArray with all notes shifted halfstep_count half steps up or down
+
+        Arguments:
+        halfstep_count -- (int) number of half steps to increase/decrease (negative value for decrements)
+        """
+        import numpy
+        return NoteArray(self._midi_ids.astype(numpy.int16) + halfstep_count)
+
+def as_note_array(notes):
+    """Returns notes as a NoteArray. notes can be a NoteArray or a list of Note objects"""
+    return notes if isinstance(notes, NoteArray) else NoteArray.from_notes(notes)
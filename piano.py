@@ -1,5 +1,3 @@
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
 import numpy as np
 import mt_toolbox as mt
 import math
@@ -28,18 +26,22 @@ white_key_width = 1
 # Height of the black keys from the origin
 black_key_y = 0.67
 
-# Create a figure and axis
-fig, ax = plt.subplots()
-fig.patch.set_facecolor('#001F3F')
-
-# Set ticks on X/Y axis
-ax.set_xticks(np.linspace(0, keyboard_size, keyboard_size+1))
-ax.set_yticks(np.linspace(0, keyboard_height, 3))
-# Hide both axes
-ax.set_axis_off()
+# Figure and axis. Created by build_keyboard, since importing matplotlib is slow
+fig, ax = None, None
 
 def build_keyboard():
-    global KEYS, CHROMATIC_NOTE_POSITIONS
+    global KEYS, CHROMATIC_NOTE_POSITIONS, fig, ax
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Rectangle
+    # Create a figure and axis
+    fig, ax = plt.subplots()
+    fig.patch.set_facecolor('#001F3F')
+
+    # Set ticks on X/Y axis
+    ax.set_xticks(np.linspace(0, keyboard_size, keyboard_size+1))
+    ax.set_yticks(np.linspace(0, keyboard_height, 3))
+    # Hide both axes
+    ax.set_axis_off()
     for n in range(0,keyboard_size):
         # white keys
         white_rectangle = Rectangle((n, 0), white_key_width, keyboard_height, edgecolor='black', facecolor='darkgrey', zorder=-1)
@@ -86,14 +88,12 @@ def command_processor(args, parser):
     NOTE_COLORS = NOTE_COLORS[-root_pos:] + NOTE_COLORS[:-root_pos]
 
     if args['scale']:
-        scale_notes = mt.construct_scale(args['root'], args['scale'], args['mode'], 4)
-        notes = [n.name for n in scale_notes]
+        notes = mt.construct_scale_array(args['root'], args['scale'], args['mode'], 4).names
         title = f"{args['root']} {args['mode']} of the {args['scale']} scale" if args['mode'] != 'Ionian' else f"{args['root']} {args['scale']} scale"
         if args['scale'] == 'Minor':
             minor_flag = True
     elif args['chord']:
-        chord_notes = mt.construct_chord(args['root'], args['chord'], 4)
-        notes = [n.name for n in chord_notes]
+        notes = mt.construct_chord_array(args['root'], args['chord'], 4).names
         title = f"{args['root']} {args['chord']} chord"
     elif args['note']:
         notes = args['note']
@@ -106,10 +106,11 @@ def command_processor(args, parser):
     return notes, title
 
 def main():
-    build_keyboard()
     parser, group = basic_parser('piano.py: A script to show positions of notes, chords and scales on a graphical piano keyboard')
     args, parser = parse_arguments(parser, group)
     notes, title = command_processor(args, parser)
+    import matplotlib.pyplot as plt
+    build_keyboard()
     show_notes(notes)
     # Display the plot
     plt.title(title, color='white')
@@ -1,11 +1,15 @@
 from os import environ
 environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
-import pygame, pygame.sndarray
-import numpy
-import scipy.signal
-from midiutil import MIDIFile
+from collections import OrderedDict
+import io
+import itertools
+import os
+import wave as wavfile
 
-from note import Note
+from note import Note, as_note_array
+# pygame is imported by init(), midiutil by the MIDI functions and numpy by the synthesis functions,
+# so that importing this module stays fast
+pygame = None
 
 ## MIDI settings
 track    = 0
@@ -14,198 +18,297 @@ duration = 8   # In beats
 tempo    = 400  # In BPM
 volume   = 100 # 0-127, as per the MIDI standard
 instrument = 0 # Instrument numbers: https://fmslogo.sourceforge.io/manual/midi-instrument.html
-midi_filename = "out.mid"
 
 ## Wave settings
 sample_rate = 44100
 sampling = 4096    # or 16384
 
+## Envelope settings (ADSR)
+attack_ms = 10      # Time to rise from silence to full amplitude
+decay_ms = 60       # Time to fall from full amplitude to the sustain level
+sustain_level = 0.8 # Amplitude (0~1) held until the release
+release_ms = 60     # Time to fall from the sustain level to silence at the end of the note
+
+## Streaming settings
+stream_block_size = 4096 # Samples per block when streaming long timelines
+
+## Wave cache settings
+wave_cache_max_bytes = 64 * 1024 * 1024 # Memory cap of cached waves and Sound objects
+
 ## Playback options
-MIDI = False # Plays as wave if false and using midiutil if True
+AUDIO_BACKEND = environ.get('MT_AUDIO_BACKEND', 'pygame') # Name of the default audio backend (see audio_backends)
 ARPEGGIATE = False # Whether to arpeggiate chords or not
 REVERSE_SCALE = False # Whether to play scales in reverse as well
 
 ## Waves
 #########
-def sine_wave(hz, peak, n_samples=sample_rate):
-    """Compute N samples of a sine wave with given frequency and peak amplitude.
-       Defaults to one second.
+def sine(phases):
+    """Sine waveform"""
+    import numpy
+    return numpy.sin(phases)
+
+# Waveform functions by waveform name. Map a phase array (radians) to amplitudes between -1 and 1
+waveforms = {
+    "sine" : sine,
+}
+
+def ms_to_samples(ms):
+    """Returns the number of samples in ms milliseconds"""
+    return int(sample_rate * ms / 1000)
+
+def adsr_envelope(n_samples, attack=attack_ms, decay=decay_ms, sustain=sustain_level, release=release_ms):
+    """Returns a float32 ADSR amplitude envelope of n_samples samples.
+       Segments are shortened proportionally if they don't fit in n_samples.
 
     Arguments:
-    hz -- sinewave frequency
-    peak -- amplitude of wave
-    n_samples -- sample rate
+    n_samples -- length of the envelope in samples
+    attack, decay, release -- segment lengths in milliseconds
+    sustain -- sustain amplitude (0~1)
     """
-    length = sample_rate / float(hz)
-    omega = numpy.pi * 2 / length
-    xvalues = numpy.arange(int(length)) * omega
-    onecycle = peak * numpy.sin(xvalues)
-    return numpy.resize(onecycle, (n_samples,)).astype(numpy.int16)
+    import numpy
+    return adsr_levels(numpy.arange(n_samples), n_samples, attack, decay, sustain, release)
+
+def adsr_levels(indices, n_samples, attack=attack_ms, decay=decay_ms, sustain=sustain_level, release=release_ms):
+    """Returns the ADSR envelope values at the given sample indices of an n_samples long note, as float32.
+       Used to envelope a part of a note without computing the whole envelope.
+
+    Arguments:
+    indices -- array of sample indices (0 ~ n_samples-1)
+    n_samples -- length of the note in samples
+    attack, decay, release -- segment lengths in milliseconds
+    sustain -- sustain amplitude (0~1)
+    """
+    import numpy
+    a, d, r = (ms_to_samples(ms) for ms in (attack, decay, release))
+    if a + d + r > n_samples:
+        scale = n_samples / (a + d + r)
+        a, d, r = int(a * scale), int(d * scale), int(r * scale)
+    points = [0, a, a + d, n_samples - r, n_samples]
+    levels = [0, 1, sustain, sustain, 0]
+    return numpy.interp(indices, points, levels).astype(numpy.float32)
+
+def voice_gain(voice_count, peak=sampling):
+    """Returns the amplitude of each voice of a mix of voice_count voices, so that the mix never exceeds peak.
+       Shared by render_voices and stream_blocks, so that a chord is as loud played or rendered to a file
+    """
+    return peak / max(voice_count, 1)
+
+def render_voices(frequencies, n_samples, peak=sampling, waveform='sine', envelope=None, normalize=True):
+    """Mixes simultaneous voices into one int16 wave.
+       All voices are rendered at once as a (voices, samples) float32 array, enveloped,
+       summed in float32 and converted to int16 once at the end.
+
+    Arguments:
+    frequencies -- list of voice frequencies in Hz
+    n_samples -- length of the wave in samples
+    peak -- amplitude of the mixed wave
+    waveform -- name of the waveform as defined in the waveforms dict
+    envelope -- None for the default ADSR envelope, False for no envelope,
+                or an array of shape (samples,) or (voices, samples) for per voice envelopes
+    normalize -- whether to scale the voices by voice_gain so that the mix never exceeds peak
+    """
+    import numpy
+    frequencies = numpy.asarray(frequencies, dtype=numpy.float64).reshape(-1, 1)
+    phases = (2 * numpy.pi / sample_rate) * frequencies * numpy.arange(n_samples)
+    voices = waveforms[waveform](phases).astype(numpy.float32)
+    if envelope is None:
+        voices *= adsr_envelope(n_samples)
+    elif envelope is not False:
+        voices *= numpy.asarray(envelope, dtype=numpy.float32)
+    mix = voices.sum(axis=0)
+    mix *= voice_gain(len(frequencies), peak) if normalize else peak
+    return numpy.clip(mix, -32768, 32767).astype(numpy.int16)
+
+class WaveCache:
+    """Bounded LRU cache of synthesized waves and their pygame Sound objects.
+       Entries are keyed by (frequencies, n_samples, peak, waveform) and evicted, least recently used first,
+       once the waves and sounds take more than max_bytes.
+    """
+
+    def __init__(self, max_bytes=wave_cache_max_bytes):
+        """Arguments:
+        max_bytes -- memory cap of the cache in bytes
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # key --> [wave, Sound or None]
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._entries:
+            wave, sound = self._entries.popitem(last=False)[1]
+            self.bytes -= wave.nbytes * (2 if sound is not None else 1)
+
+    def wave(self, key, builder):
+        """Returns the cached wave of key, building it with builder() on a miss"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            wave = builder()
+            wave.setflags(write=False)
+            self._entries[key] = [wave, None]
+            self.bytes += wave.nbytes
+            self._evict()
+            return wave
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
 
-def play_wave(wave, ms):
-    """Play given samples, as a sound, for ms milliseconds.
+    def sound(self, key, builder):
+        """Returns the cached pygame Sound of key, building its wave with builder() on a miss"""
+        init()
+        wave = self.wave(key, builder)
+        entry = self._entries.get(key)
+        if entry is None:
+            # Larger than the whole cache
+            return pygame.sndarray.make_sound(wave)
+        if entry[1] is None:
+            entry[1] = pygame.sndarray.make_sound(wave)
+            self.bytes += wave.nbytes
+            self._evict()
+        return entry[1]
+
+    def cache_info(self):
+        """Returns a dict of cache statistics"""
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'bytes': self.bytes,
+                'max_bytes': self.max_bytes, 'hit_rate': self.hits / total if total else 0.0}
+
+    def clear(self):
+        """Empties the cache and resets the statistics"""
+        self._entries.clear()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+wave_cache = WaveCache()
+
+def _synthesize(frequencies, n_samples, peak, waveform):
+    """Returns the mixed wave of all frequencies"""
+    return render_voices(frequencies, n_samples, peak, waveform)
+
+def _wave_key(frequencies, peak, n_samples, waveform):
+    return (tuple(frequencies), n_samples, peak, waveform)
+
+def notes_wave(notes, peak=sampling, n_samples=sample_rate, waveform='sine'):
+    """Returns the cached wave of one or more simultaneous notes
 
     Arguments:
-    wave -- wave to play
-    ms -- length in milliseconds to play
+    notes -- list of Note objects (a single note for a plain note wave)
+    peak -- amplitude of each note wave
+    n_samples -- length of the wave in samples
+    waveform -- name of the waveform as defined in the waveforms dict
     """
-    # In pygame 1.9.1, we can pass sample_wave directly,
-    # but in 1.9.2 they changed the mixer to only accept ints.
-    sound = pygame.sndarray.make_sound(wave.astype(numpy.int16))
-    sound.play(-1)
-    pygame.time.delay(ms)
-    sound.stop()
+    key = _wave_key((n.frequency for n in notes), peak, n_samples, waveform)
+    return wave_cache.wave(key, lambda: _synthesize(*key))
 
-def play_piece(notes, ms):
+def notes_sound(notes, peak=sampling, n_samples=sample_rate, waveform='sine'):
+    """Returns the cached pygame Sound of one or more simultaneous notes. See notes_wave"""
+    key = _wave_key((n.frequency for n in notes), peak, n_samples, waveform)
+    return wave_cache.sound(key, lambda: _synthesize(*key))
+
+def play_piece(notes, ms, name=None):
     """Play an array of note frequencies ms milliseconds each
 
     Arguments:
     notes -- array of Note objects
     ms -- length in milliseconds for notes to play
+    name -- name of the piece, used by backends that save what they play
     """
+    get_backend().play(piece_segments(notes, ms), name)
 
-    for n in notes:
-        play_note(n, ms)
+def pause(ms):
+    """Waits ms milliseconds between two pieces, if the backend plays in real time"""
+    get_backend().pause(ms)
+
+def _announce(message, segments):
+    """Prints message when the playback reaches segments"""
+    print(message)
+    yield from segments
 
 ## Notes
 #########
-def play_note(note, ms):
+def play_note(note, ms, name=None):
     """Play one note for ms milliseconds by passing note name
 
     Arguments:
     note -- Note object
     ms -- length in milliseconds for note to play
+    name -- name of the piece, used by backends that save what they play
     """
-    if MIDI:
-        create_midi([note], 'note')
-        play_midi_file(midi_filename)
-    else:
-        play_wave(sine_wave(note.frequency, sampling), ms)
+    get_backend().play(note_segments(note, ms), name)
 
 ## Chords
 #########
-def play_chord(chord_notes):
+def play_chord(chord_notes, name=None):
     """Play a combination of notes simultaneously (chord)
 
     Arguments:
     chord_notes -- List of Note objects respresenting the chord
+    name -- name of the piece, used by backends that save what they play
     """
-    chord_wave = 0
-    for note in chord_notes:
-        chord_wave = sum([chord_wave, sine_wave(note.frequency, sampling)])
-
-    print('Chord is now being played..')
-    if MIDI:
-        create_midi(chord_notes, 'chord')
-        play_midi_file(midi_filename)
-    else:
-        play_wave(chord_wave, 700)
-    pygame.time.delay(100)
-
+    parts = [_announce('Chord is now being played..', [(chord_notes, 700), ([], 100)])]
     if ARPEGGIATE:
-        print('Single notes of the chord are now being played separately..')
-        if MIDI:
-            create_midi(chord_notes, 'scale', t = 0.3)
-            play_midi_file(midi_filename)
-        else:
-            for note in chord_notes:
-                play_wave(sine_wave(note.frequency, sampling), 500)
-        pygame.time.delay(100)
-        print('Chord is now being played again..')
-        if MIDI:
-            create_midi(chord_notes, 'chord')
-            play_midi_file(midi_filename)
-        else:
-            play_wave(chord_wave, 700)
+        parts.append(_announce('Single notes of the chord are now being played separately..', [*piece_segments(chord_notes, 500), ([], 100)]))
+        parts.append(_announce('Chord is now being played again..', [(chord_notes, 700)]))
+    get_backend().play(itertools.chain.from_iterable(parts), name)
 
 ## Scales
 #########
-def play_scale(scale_notes, ms):
+def play_scale(scale_notes, ms, name=None):
     """Plays a scale
 
     Arguments:
     scale_notes -- A list of Note objects of which the scale to play is made
     ms -- length in milliseconds for each note
+    name -- name of the piece, used by backends that save what they play
     """
-    print('Scale is now being played forward..')
-    if MIDI:
-        create_midi(scale_notes, 'scale')
-        play_midi_file(midi_filename)
-    else:
-        play_piece(scale_notes, ms)
-
+    parts = [_announce('Scale is now being played forward..', piece_segments(scale_notes, ms))]
     if REVERSE_SCALE:
-        # Extend scale by the reverse scale
-        reverse_scale = scale_notes[::-1]
-        scale_notes.extend(reverse_scale[1:]) # drop the first element to nicely play the reverse part
-        pygame.time.delay(200)
-        print('Scale is now being played forward and then backwards..')
-        if MIDI:
-            create_midi(scale_notes, 'scale')
-            play_midi_file(midi_filename)
-        else:
-            play_piece(scale_notes, ms)
+        # Extend scale by the reverse scale, dropping the first element to nicely play the reverse part
+        scale_notes = list(scale_notes)
+        parts.append([([], 200)])
+        parts.append(_announce('Scale is now being played forward and then backwards..', piece_segments(scale_notes + scale_notes[-2::-1], ms)))
+    get_backend().play(itertools.chain.from_iterable(parts), name)
 
 ## MIDI files
 #############
-def create_midi(note_list, type, t = 0.3):
-    """writes a midi file
+def create_segments_midi(segments):
+    """Builds a midi file of a timeline in memory and returns it as a file object (io.BytesIO)
 
     Arguments:
-    note_list -- list of note objects in chord or scale
-    type -- 'scale' or 'chord' to either play harmonically or melodically
-    t -- time in seconds between single notes when playing a scale
+    segments -- iterable of (notes, ms) pairs. See scale_segments, chord_segments..etc
     """
+    from midiutil import MIDIFile
     time = 0
-    MyMIDI = MIDIFile(1) # One track, defaults to format 1 (tempo track
-                     # automatically created)
+    MyMIDI = MIDIFile(1)
     MyMIDI.addProgramChange(track, channel, time, instrument)
-    MyMIDI.addTempo(track,time, tempo)
-
-    for note in note_list:
-        MyMIDI.addNote(track, channel, note.midi_id, time, duration, volume)
-        if type == 'scale':
-            # convert t from seconds to beats
-            padding_in_beats = ((t * tempo)/60)+0.1 # +0.1 beats to account for system delay
-            time += padding_in_beats
-    with open(midi_filename, "wb") as output_file:
-        MyMIDI.writeFile(output_file)
+    MyMIDI.addTempo(track, time, tempo)
+    for notes, ms in segments:
+        # convert ms to beats
+        beats = ms * tempo / 60000
+        for midi_id in as_note_array(notes).midi_ids.tolist():
+            MyMIDI.addNote(track, channel, midi_id, time, beats, volume)
+        time += beats
+    return midi_buffer(MyMIDI)
 
-def create_arp_chord_midi(note_list, t = 1.5):
-    """writes a midi file of a chord first arpeggiated and then harmonically played
+def midi_buffer(midi):
+    """Writes a MIDIFile object into an in-memory file object, rewound for reading
 
     Arguments:
-    note_list -- list of note objects in chord or scale
-    t -- time in seconds between single notes when playing a scale
+    midi -- midiutil MIDIFile object
     """
-    time = 0
-    MyMIDI = MIDIFile(1) # One track, defaults to format 1 (tempo track
-                     # automatically created)
-    MyMIDI.addProgramChange(track, channel, time, instrument)
-    MyMIDI.addTempo(track,time, tempo)
-    # Melodic
-    for note in note_list:
-        MyMIDI.addNote(track, channel, note.midi_id, time, duration, volume)
-        # convert t from seconds to beats
-        padding_in_beats = ((t * tempo)/60)+0.1 # +0.1 beats to account for system delay
-        time += padding_in_beats
-    # small delay between the two pieces
-    time += 2.5*padding_in_beats
-    # Harmonic
-    for note in note_list:
-        MyMIDI.addNote(track, channel, note.midi_id, time, duration, volume)
-
-    with open(midi_filename, "wb") as output_file:
-        MyMIDI.writeFile(output_file)
-
-def play_midi_file(midi_filename):
-    '''Stream music_file in a blocking manner'''
+    buffer = io.BytesIO()
+    midi.writeFile(buffer)
+    buffer.seek(0)
+    return buffer
+
+def play_midi_file(midi_file):
+    '''Stream a midi file (path or file object) in a blocking manner'''
+    import async_playback
     try:
-        clock = pygame.time.Clock()
-        pygame.mixer.music.load(midi_filename)
-        pygame.mixer.music.play()
-        while pygame.mixer.music.get_busy():
-            clock.tick(30) # check if playback has finished
+        async_playback.run(async_playback.play_midi(midi_file))
     except KeyboardInterrupt:
         # if user hits Ctrl/C then exit
         # (works only in console mode)
@@ -214,13 +317,237 @@ def play_midi_file(midi_filename):
         raise SystemExit
 
 def init():
-    """Code to initialize pygame"""
+    """Code to initialize pygame. Called on first playback, so that rendering never opens an audio device"""
+    global pygame
+    if pygame is None:
+        import pygame, pygame.sndarray
+    if pygame.mixer.get_init():
+        return
     ##pygame 1.9.6
     pygame.mixer.init(sample_rate, -16, 1) # 44.1kHz, 16-bit signed, mono
     # optional volume 0 to 1.0
     #pygame.mixer.music.set_volume(0.8)
 
+## Audio backends
+##################
+# Backends play timelines of segments (see note_segments, scale_segments..etc).
+# The backend in use is created on first playback from AUDIO_BACKEND, or chosen with set_backend.
+class AudioBackend:
+    """Base class of audio backends"""
+    def play(self, segments, name=None):
+        """Plays a timeline. Returns when it ends
+
+        Arguments:
+        segments -- iterable of (notes, ms) pairs
+        name -- name of the timeline, used by backends that save what they play
+        """
+        raise NotImplementedError
+
+    async def play_async(self, segments, name=None):
+        """Coroutine version of play, used by async_playback. Cancelling it stops the playback.
+           Runs play in a worker thread unless the backend plays in real time
+        """
+        import asyncio
+        await asyncio.get_running_loop().run_in_executor(None, self.play, segments, name)
+
+    def pause(self, ms):
+        """Waits ms milliseconds between two timelines. No-op unless the backend plays in real time"""
+
+class PygameBackend(AudioBackend):
+    """Synthesizes the notes and plays them through the pygame mixer.
+       Timelines are streamed block by block into a mixer channel queue (see play_stream)
+    """
+    def __init__(self):
+        init()
+
+    def play(self, segments, name=None):
+        play_stream(stream_blocks(segments))
+
+    async def play_async(self, segments, name=None):
+        import async_playback
+        await async_playback.play_synth(segments)
+
+    def pause(self, ms):
+        pygame.time.delay(ms)
+
+class PygameMidiBackend(PygameBackend):
+    """Plays the notes as MIDI (General MIDI instrument) through the pygame mixer"""
+    def play(self, segments, name=None):
+        play_midi_file(create_segments_midi(segments))
+
+    async def play_async(self, segments, name=None):
+        import async_playback
+        await async_playback.play_midi(create_segments_midi(segments))
+
+class WavFileBackend(AudioBackend):
+    """Renders every timeline to a WAV file instead of playing it. No audio device needed
+
+    Arguments:
+    directory -- directory to write the WAV files to
+    """
+    def __init__(self, directory='.'):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.count = 0
+
+    def play(self, segments, name=None):
+        self.count += 1
+        path = os.path.join(self.directory, f'{name or f"out_{self.count:04d}"}.wav')
+        n_samples = write_wav_stream(path, stream_blocks(segments))
+        print(f'Saved {path} ({n_samples/sample_rate:.2f} s)')
+
+class NullBackend(AudioBackend):
+    """Discards everything, without delays. For tests and batch runs"""
+    def play(self, segments, name=None):
+        for _ in segments:
+            pass
+
+class RecordingBackend(AudioBackend):
+    """Keeps the played timelines in self.timelines, as (name, list of segments) pairs, instead of playing them"""
+    def __init__(self):
+        self.timelines = []
+
+    def play(self, segments, name=None):
+        self.timelines.append((name, list(segments)))
+
+# Backend classes by name
+audio_backends = {
+    'pygame' : PygameBackend,
+    'midi' : PygameMidiBackend,
+    'wav' : WavFileBackend,
+    'null' : NullBackend,
+    'recording' : RecordingBackend,
+}
+backend = None # Backend in use
+
+def set_backend(name, **kwargs):
+    """Selects the audio backend and returns it
+
+    Arguments:
+    name -- name of the backend as defined in the audio_backends dict
+    kwargs -- passed to the backend class. Ex.: directory for 'wav'
+    """
+    global backend
+    if name not in audio_backends:
+        raise ValueError("Invalid audio backend")
+    backend = audio_backends[name](**kwargs)
+    return backend
+
+def get_backend():
+    """Returns the backend in use, creating the AUDIO_BACKEND one on first use"""
+    if backend is None:
+        set_backend(AUDIO_BACKEND)
+    return backend
+
+## Timelines
+##############
+# Timelines are described as segments: (notes, ms) pairs of simultaneous notes (empty for silence) and their length
+def note_segments(note, ms):
+    """Generates the segments of one note (see play_note)"""
+    yield ([note], ms)
+
+def piece_segments(notes, ms):
+    """Generates the segments of notes played one after another, ms milliseconds each (see play_piece)"""
+    for n in notes:
+        yield ([n], ms)
+
+def scale_segments(scale_notes, ms):
+    """Generates the segments of a scale as played by play_scale, including the reverse part if REVERSE_SCALE is set"""
+    yield from piece_segments(scale_notes, ms)
+    if REVERSE_SCALE:
+        scale_notes = list(scale_notes)
+        yield ([], 200)
+        yield from piece_segments(scale_notes + scale_notes[-2::-1], ms)
+
+def chord_segments(chord_notes):
+    """Generates the segments of a chord as played by play_chord, including the arpeggiated part if ARPEGGIATE is set"""
+    yield (chord_notes, 700)
+    yield ([], 100)
+    if ARPEGGIATE:
+        yield from piece_segments(chord_notes, 500)
+        yield ([], 100)
+        yield (chord_notes, 700)
+
+## Block streaming
+##################
+# Renders timelines of any length as fixed size blocks, so memory stays flat whatever the timeline length.
+# The blocks feed either the mixer queue (play_stream) or a WAV file (write_wav_stream)
+def stream_blocks(segments, block_size=stream_block_size, peak=sampling, waveform='sine'):
+    """Generates the int16 wave of a timeline as blocks of block_size samples (the last block may be shorter).
+       Voice phases are carried across block boundaries, so notes spanning several blocks stay continuous.
+       Chords are scaled by voice_gain, as in render_voices.
+
+    Arguments:
+    segments -- iterable of (notes, ms) pairs. See scale_segments, chord_segments..etc
+    block_size -- block length in samples
+    peak -- amplitude of the wave
+    waveform -- name of the waveform as defined in the waveforms dict
+    """
+    import numpy
+    block = numpy.zeros(block_size, dtype=numpy.float32)
+    filled = 0
+    for notes, ms in segments:
+        n_samples = ms_to_samples(ms)
+        omegas = (2 * numpy.pi / sample_rate) * numpy.array([n.frequency for n in notes], dtype=numpy.float64).reshape(-1, 1)
+        phases = numpy.zeros((len(notes), 1))
+        gain = voice_gain(len(notes), peak)
+        pos = 0
+        while pos < n_samples:
+            count = min(block_size - filled, n_samples - pos)
+            if len(notes):
+                steps = numpy.arange(count)
+                voices = waveforms[waveform](phases + omegas * steps)
+                block[filled:filled+count] = voices.sum(axis=0) * adsr_levels(steps + pos, n_samples) * gain
+                # carry the phase of every voice to the next block
+                phases = (phases + omegas * count) % (2 * numpy.pi)
+            else:
+                block[filled:filled+count] = 0
+            filled += count
+            pos += count
+            if filled == block_size:
+                yield numpy.clip(block, -32768, 32767).astype(numpy.int16)
+                filled = 0
+    if filled:
+        yield numpy.clip(block[:filled], -32768, 32767).astype(numpy.int16)
+
+def play_stream(blocks):
+    """Plays int16 mono blocks back to back through a mixer channel queue, rendering one block ahead.
+       Returns when the last block ends
+
+    Arguments:
+    blocks -- iterable of int16 wave arrays. See stream_blocks
+    """
+    init()
+    channel = None
+    for block in blocks:
+        sound = pygame.sndarray.make_sound(block)
+        if channel is None:
+            channel = sound.play()
+            continue
+        # wait for the queued block to start before queuing the next one
+        while channel.get_queue() is not None:
+            pygame.time.delay(5)
+        channel.queue(sound)
+    while channel is not None and channel.get_busy():
+        pygame.time.delay(5)
+
+def write_wav_stream(filename, blocks):
+    """Writes int16 mono blocks to a WAV file one block at a time. Returns the number of samples written
+
+    Arguments:
+    filename -- path (or seekable file object) to write to
+    blocks -- iterable of int16 wave arrays. See stream_blocks
+    """
+    import numpy
+    n_samples = 0
+    with wavfile.open(filename, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        for block in blocks:
+            f.writeframes(numpy.ascontiguousarray(block, dtype='<i2').tobytes())
+            n_samples += len(block)
+    return n_samples
+
 if __name__ == '__main__':
     print('module for music playback functions')
-else:
-    init()
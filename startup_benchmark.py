@@ -0,0 +1,59 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+## Startup benchmark
+# Measures the cold start time of each subcommand: a fresh interpreter per run, with the null audio backend
+# so that only startup and console output are timed, not playback.
+
+# Subcommands to time, and their startup budget in milliseconds.
+# Listing and console printing must start in tens of milliseconds. Progressions need numpy, the views matplotlib
+subcommands = {
+    'help' : (['music_theory_lab.py', '-h'], 100),
+    'list' : (['music_theory_lab.py', '-l'], 100),
+    'note' : (['music_theory_lab.py', '-n', 'C'], 100),
+    'scale' : (['music_theory_lab.py', '-s', 'Major', '-r', 'C'], 100),
+    'chord' : (['music_theory_lab.py', '-c', 'Major_triad', '-r', 'C'], 100),
+    'progression' : (['music_theory_lab.py', '-p', '1', '4', '5', '1'], 300),
+    'guitar help' : (['guitar.py', '-h'], 250),
+    'piano help' : (['piano.py', '-h'], 250),
+}
+
+def time_command(command, runs):
+    """Returns the wall times in milliseconds of runs fresh runs of a script
+
+    Arguments:
+    command -- script name followed by its arguments
+    runs -- number of runs
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, MT_AUDIO_BACKEND='null')
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *command], cwd=directory, env=env, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description='startup_benchmark.py: Measure the cold start time of each subcommand')
+    parser.add_argument('-n','--runs', help='Runs per subcommand', default = 5, type = int, metavar = '')
+    parser.add_argument('-s','--subcommands', nargs='+', choices=list(subcommands), help='Subcommands to time. Defaults to all', metavar = '')
+    args = parser.parse_args()
+    over_budget = []
+    print(f'{"subcommand":<14}{"median":>10}{"min":>10}{"budget":>10}')
+    for name in args.subcommands or subcommands:
+        command, budget = subcommands[name]
+        times = time_command(command, args.runs)
+        median = statistics.median(times)
+        print(f'{name:<14}{median:>8.0f}ms{min(times):>8.0f}ms{budget:>8}ms{"  OVER" if median > budget else ""}')
+        if median > budget:
+            over_budget.append(name)
+    if over_budget:
+        sys.exit(f'Over the startup budget: {", ".join(over_budget)}')
+
+if __name__ == '__main__':
+    main()
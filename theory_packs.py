@@ -0,0 +1,157 @@
+# Scale and chord packs
+# A pack is a JSON or TOML file defining extra scales and chords. Example (JSON):
+# {
+#     "scales": {
+#         "Hirajoshi" : {"steps" : [2,1,4,1,4], "info" : "Japanese pentatonic scale"}
+#     },
+#     "chords": {
+#         "Major_6_9" : {"signature" : [1,3,5,6,9], "info" : ""}
+#     }
+# }
+# Scale steps are half step counts between consecutive notes, including the last note to next octave step.
+# Chord signatures use the same interval names as all_chord_info.
+# Compiled packs are cached on disk, keyed by the hash of the pack content.
+import hashlib
+import json
+import os
+import mt_toolbox as mt
+
+# Bump when the compiled format changes to invalidate existing cache files
+COMPILER_VERSION = 2
+# Directory where compiled packs are cached
+CACHE_DIR = os.environ.get('MT_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'music_theory'))
+
+def read_pack(path):
+    """Returns the parsed content of a JSON or TOML pack file and the hash of its raw bytes
+
+    Arguments:
+    path -- path to a .json or .toml file
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    if path.endswith('.toml'):
+        # Imported here, since most runs load no TOML pack
+        try:
+            import tomllib
+        except ImportError:
+            # Python < 3.11
+            try:
+                import tomli as tomllib
+            except ImportError:
+                tomllib = None
+        if tomllib is None:
+            raise ValueError(f"Invalid pack {path}: TOML packs need Python 3.11+ or the tomli package")
+        pack = tomllib.loads(raw.decode('utf-8'))
+    elif path.endswith('.json'):
+        pack = json.loads(raw)
+    else:
+        raise ValueError(f"Invalid pack {path}: expected a .json or .toml file")
+    digest = hashlib.sha256(raw + f'v{COMPILER_VERSION}'.encode()).hexdigest()
+    return pack, digest
+
+def compile_pack(pack, path=''):
+    """Validates a parsed pack and returns its compiled form
+       Scales compile to steps and pitch class mask.
+       Chords compile to semitone offsets and pitch class mask.
+
+    Arguments:
+    pack -- dict as returned by read_pack
+    path -- pack path, used in error messages
+    """
+    if not isinstance(pack, dict) or not set(pack) <= {'scales', 'chords'}:
+        raise ValueError(f"Invalid pack {path}: expected only 'scales' and 'chords' tables")
+    for table in ('scales', 'chords'):
+        if not isinstance(pack.get(table, {}), dict):
+            raise ValueError(f"Invalid pack {path}: '{table}' must be a table of names to definitions")
+    compiled = {'scales': {}, 'chords': {}}
+    for scale_name, scale in pack.get('scales', {}).items():
+        if not isinstance(scale, dict):
+            raise ValueError(f"Invalid scale {scale_name} in {path}: expected a table with 'steps' and 'info'")
+        steps = scale.get('steps')
+        if not isinstance(steps, list) or not steps or not all(type(n) is int and n > 0 for n in steps):
+            raise ValueError(f"Invalid scale {scale_name} in {path}: steps must be positive integers")
+        if sum(steps) != 12:
+            raise ValueError(f"Invalid scale {scale_name} in {path}: steps sum to {sum(steps)} instead of an octave (12)")
+        compiled['scales'][scale_name] = {'steps': steps, 'mask': mt.positions_to_mask(mt.steps_to_positions(steps)),
+                                          'info': scale.get('info', '')}
+    for chord_name, chord in pack.get('chords', {}).items():
+        if not isinstance(chord, dict):
+            raise ValueError(f"Invalid chord {chord_name} in {path}: expected a table with 'signature' and 'info'")
+        signature = chord.get('signature')
+        if not isinstance(signature, list) or not signature:
+            raise ValueError(f"Invalid chord {chord_name} in {path}: missing signature")
+        try:
+            offsets = [mt.parse_interval(i).semitone_offset for i in signature]
+        except (ValueError, TypeError):
+            # TypeError: unhashable tokens such as lists
+            raise ValueError(f"Invalid chord {chord_name} in {path}: unknown interval in {signature}")
+        compiled['chords'][chord_name] = {'signature': signature, 'offsets': offsets,
+                                          'mask': mt.positions_to_mask(offsets), 'info': chord.get('info', '')}
+    return compiled
+
+# Fields of the compiled scales and chords, as written by compile_pack
+COMPILED_FIELDS = {'scales': {'steps', 'mask', 'info'}, 'chords': {'signature', 'offsets', 'mask', 'info'}}
+
+def _read_cache(cache_path):
+    """Returns the compiled pack stored in a cache file, or None if it is missing, unreadable or not a compiled pack"""
+    try:
+        with open(cache_path) as f:
+            compiled = json.load(f)
+    except (OSError, ValueError):
+        # ValueError: truncated or foreign file
+        return None
+    if not isinstance(compiled, dict) or set(compiled) != set(COMPILED_FIELDS):
+        return None
+    for table, fields in COMPILED_FIELDS.items():
+        if not isinstance(compiled[table], dict) or not all(isinstance(e, dict) and set(e) == fields for e in compiled[table].values()):
+            return None
+    return compiled
+
+def load_pack(path, cache_dir=CACHE_DIR):
+    """Returns the compiled form of a pack, from the on-disk cache if the pack content did not change.
+       Cache files that can't be read back are recompiled and rewritten
+
+    Arguments:
+    path -- path to a .json or .toml file
+    cache_dir -- directory of compiled packs. None to disable caching
+    """
+    pack, digest = read_pack(path)
+    cache_path = os.path.join(cache_dir, f'{digest}.json') if cache_dir else None
+    compiled = _read_cache(cache_path) if cache_path else None
+    if compiled is not None:
+        return compiled
+    compiled = compile_pack(pack, path)
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(compiled, f)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # caching is only an optimization
+            pass
+    return compiled
+
+def register_pack(path, cache_dir=CACHE_DIR):
+    """Loads a pack and adds its scales and chords to mt_toolbox, with their compiled masks and offsets
+
+    Arguments:
+    path -- path to a .json or .toml file
+    cache_dir -- directory of compiled packs. None to disable caching
+    """
+    compiled = load_pack(path, cache_dir)
+    for scale_name, scale in compiled['scales'].items():
+        if scale_name in mt.all_scale_info and mt.scale_steps[scale_name] != scale['steps']:
+            raise ValueError(f"Invalid scale {scale_name} in {path}: already defined with a different signature")
+    for chord_name, chord in compiled['chords'].items():
+        if chord_name in mt.all_chord_info and mt.all_chord_info[chord_name]['signature'] != chord['signature']:
+            raise ValueError(f"Invalid chord {chord_name} in {path}: already defined with a different signature")
+    for scale_name, scale in compiled['scales'].items():
+        mt.register_scale(scale_name, scale['steps'], scale['info'], mask=scale['mask'])
+    for chord_name, chord in compiled['chords'].items():
+        mt.register_chord(chord_name, chord['signature'], chord['info'], offsets=chord['offsets'], mask=chord['mask'])
+    return compiled
+
+if __name__ == '__main__':
+    print('module for loading scale and chord packs')